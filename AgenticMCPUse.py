@@ -1,377 +1,223 @@
 import os
+import logging
 from dotenv import load_dotenv
-from mcp import ClientSession, StdioServerParameters, types
-from mcp.client.stdio import stdio_client
 import asyncio
-from google import genai
 from concurrent.futures import TimeoutError
-from functools import partial
+from server_pool import ServerPool, DEFAULT_SERVERS
+from tool_registry import ToolRegistry
+from tool_args import ToolArgumentError, parse_response
+from tool_batch import run_calls
+from tool_cache import create_cache
+from tool_results import as_page, collect_pages, items_text, prompt_view, result_text
+from conversation import Conversation, estimate_tokens
+from llm_backend import create_backend
+from tool_retrieval import ToolSelector
+from tracing import format_summary, init_tracing, tracer
+from log_setup import setup_logging
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Access your API key and initialize Gemini client correctly
-api_key = os.getenv("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key)
+logger = logging.getLogger("agent")
 
 max_iterations = 5
-last_response = None
-iteration = 0
-iteration_response = []
-
-async def generate_with_timeout(client, prompt, timeout=10):
+# Token budget for the step history in the prompt (0 = unlimited)
+context_budget = int(os.getenv("CONTEXT_BUDGET_TOKENS", "1500"))
+# Run independent calls from one JSON batch concurrently (0 = one at a time)
+parallel_tool_calls = os.getenv("PARALLEL_TOOL_CALLS", "1") != "0"
+# Tools listed in the prompt per query, picked by relevance (0 = always the full catalog)
+tool_top_k = int(os.getenv("TOOL_TOP_K", "10"))
+
+async def generate_with_timeout(llm, prompt, timeout=10, system=None):
     """Generate content with a timeout"""
-    print("Starting LLM generation...")
+    logger.debug("Starting LLM generation...")
     try:
-        # Convert the synchronous generate_content call to run in a thread
-        loop = asyncio.get_event_loop()
-        response = await asyncio.wait_for(
-            loop.run_in_executor(
-                None, 
-                lambda: client.models.generate_content(
-                    model="gemini-2.0-flash",
-                    contents=prompt
-                )
-            ),
-            timeout=timeout
-        )
-        print("LLM generation completed")
+        # The backend is natively async, so the timeout cancels the request itself
+        with tracer.span("llm.generate", prompt_chars=len(prompt), system_chars=len(system or "")):
+            response = await llm.generate(prompt, timeout=timeout, system=system)
+        logger.debug("LLM generation completed")
         return response
     except TimeoutError:
-        print("LLM generation timed out!")
+        logger.warning("LLM generation timed out!")
         raise
     except Exception as e:
-        print(f"Error in LLM generation: {e}")
+        logger.error("Error in LLM generation: %s", e)
         raise
 
-async def main():
-    print("Starting main execution...")
-    try:
-        # Create a single MCP server connection
-        print("Establishing connection to Math MCP server...")
-        math_server_params = StdioServerParameters(
-            command="python",
-            args=["math_server.py"]
+async def execute_call(registry, call, cache=None):
+    """Convert arguments and run one tool call, returning (arguments, result text)"""
+    # Single lookup in the registry built after list_tools
+    entry = registry.get(call.name)
+    if entry is None:
+        raise ToolArgumentError(call.name, None, call.params, "unknown function")
+
+    with tracer.span("tool.convert", tool=call.name):
+        arguments = entry.convert(call.params)
+
+    # Pure tools are answered from the cache without an IPC round trip
+    use_cache = cache is not None and entry.pure
+    if use_cache:
+        cached = cache.get(call.name, arguments)
+        if cached is not None:
+            logger.debug("Cache hit for %s with arguments: %s", call.name, arguments)
+            return arguments, cached
+
+    logger.debug("Executing MCP tool call %s on %s with arguments: %s", call.name, entry.server, arguments)
+    with tracer.span("tool.call", tool=call.name, server=entry.server):
+        result = await entry.session.call_tool(call.name, arguments=arguments, meta=tracer.request_meta())
+    
+    logger.debug("Function call result: %s", result)
+    
+    # Get the full result content, following the pages of a paged result
+    iteration_result = result_text(result)
+    page = as_page(iteration_result)
+    if page is not None:
+        with tracer.span("tool.pages", tool=call.name):
+            items, total, error = await collect_pages(entry.session, page)
+        iteration_result = items_text(items, total, error)
+        
+    if use_cache and not getattr(result, 'isError', False):
+        cache.put(call.name, arguments, iteration_result)
+    return arguments, iteration_result
+
+
+async def run_agent(query, registry, llm, selector, name="agent", cache=None):
+    """Run one agent to completion; all state is local so many can share a server pool"""
+    with tracer.span("agent.run", agent=name):
+        with tracer.span("prompt.build"):
+            system_prompt = selector.system_prompt(query)
+        return await agent_loop(query, registry, llm, system_prompt, name, cache)
+
+
+async def agent_loop(query, registry, llm, system_prompt, name, cache):
+    conversation = Conversation(query, context_budget=context_budget)
+    iteration = 0
+    last_response = None
+    final_answer = None
+    error = None
+
+    logger.debug("[%s] Starting iteration loop...", name)
+    while iteration < max_iterations:
+        logger.info("[%s] Iteration %s", name, iteration + 1)
+        with tracer.span("prompt.render", iteration=iteration + 1):
+            current_query = conversation.render()
+            # The system prompt goes separately, as the unchanging prefix of every request
+            prompt = f"Query: {current_query}"
+
+        # Get model's response with timeout
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Prompt tokens: ~%s (system ~%s, query and history ~%s, %s steps summarized)",
+                         estimate_tokens(system_prompt) + estimate_tokens(prompt), estimate_tokens(system_prompt),
+                         conversation.last_render_tokens, conversation.summarized_steps)
+        try:
+            response = await generate_with_timeout(llm, prompt, system=system_prompt)
+            response_text = response.text.strip()
+            logger.info("[%s] LLM Response: %s", name, response_text)
+        except Exception as e:
+            logger.error("[%s] Failed to get LLM response: %s", name, e)
+            error = f"LLM error: {e}"
+            break
+
+        try:
+            with tracer.span("parse"):
+                parsed = parse_response(response_text)
+            for call in parsed.calls:
+                logger.debug("Calling function %s with params %s", call.name, call.params)
+        except ValueError as e:
+            logger.warning("[%s] Could not parse LLM response: %s", name, e)
+            conversation.add_step(f"Error in iteration {iteration + 1}: could not parse your response ({e}).")
+            iteration += 1
+            continue
+
+        if parsed.final_answer is not None:
+            logger.info("[%s] Agent Execution Complete", name)
+            final_answer = parsed.final_answer
+            iteration += 1
+            break
+
+        outcomes = await run_calls(
+            parsed.calls,
+            lambda call: execute_call(registry, call, cache),
+            concurrent=parallel_tool_calls,
         )
+        for outcome in outcomes:
+            call = outcome.call
+            if outcome.error is None:
+                result_view = prompt_view(outcome.result)
+                logger.info("[%s] %s returned %s", name, call.name, result_view)
+                conversation.add_step(
+                    f"In the {iteration + 1} iteration you called {call.name} with {prompt_view(str(outcome.arguments))} parameters, "
+                    f"and the function returned {result_view}.",
+                    summary=f"{iteration + 1}: {call.name} -> {outcome.result[:80]}."
+                )
+                last_response = outcome.result
 
-        # Create a Paint MCP server connection
-        print("Establishing connection to Paint MCP server...")
-        paint_server_params = StdioServerParameters(
-            command="python",
-            args=["paint_server.py"]
-        )
+            elif isinstance(outcome.error, ToolArgumentError):
+                # Let the model correct its call on the next iteration
+                logger.warning("[%s] Invalid tool call: %s", name, outcome.error)
+                conversation.add_step(f"Error in iteration {iteration + 1}: {outcome.error}.")
 
-        # Create a Gmail MCP server connection
-        print("Establishing connection to Gmail MCP server...")
-        gmail_server_params = StdioServerParameters(
-            command="python",
-            args=["gmail_server.py"]
-        )
+            else:
+                logger.error("[%s] Error calling tool: %s", name, outcome.error)
+                conversation.add_step(f"Error in iteration {iteration + 1}: {str(outcome.error)}")
+                error = str(outcome.error)
+
+        if error:
+            break
+
+        iteration += 1
 
-        async with stdio_client(math_server_params) as (math_read, math_write), \
-            stdio_client(paint_server_params) as (paint_read, paint_write), \
-            stdio_client(gmail_server_params) as (gmail_read, gmail_write):
-
-            print("Connection established, creating session...")
-            async with ClientSession(math_read, math_write) as math_session, \
-                ClientSession(paint_read, paint_write) as paint_session, \
-                ClientSession(gmail_read, gmail_write) as gmail_session:
-                
-                print("Session created, initializing...")
-                await math_session.initialize()
-                await paint_session.initialize()
-                await gmail_session.initialize()
-                
-                # Get available tools
-                print("Requesting tool list...")
-                math_tools_result = await math_session.list_tools()
-                paint_tools_result = await paint_session.list_tools()
-                gmail_tools_result = await gmail_session.list_tools()
-                
-                math_tools = math_tools_result.tools
-                paint_tools = paint_tools_result.tools
-                gmail_tools = gmail_tools_result.tools
-
-                print(f"Successfully retrieved {len(math_tools)} Math tools, {len(paint_tools)} Paint tools and {len(gmail_tools)} Gmail tools")
-
-                # Create system prompt with available tools
-                print("Creating system prompt...")
-                
-                tools_description = []
-                
-                # Add Math tools
-                tools_description.append("MATH TOOLS:")
-                for i, tool in enumerate(math_tools):
-                    try:
-                        params = tool.inputSchema
-                        desc = getattr(tool, 'description', 'No description available')
-                        name = getattr(tool, 'name', f'tool_{i}')
-                        
-                        if 'properties' in params:
-                            param_details = []
-                            for param_name, param_info in params['properties'].items():
-                                param_type = param_info.get('type', 'unknown')
-                                param_details.append(f"{param_name}: {param_type}")
-                            params_str = ', '.join(param_details)
-                        else:
-                            params_str = 'no parameters'
-
-                        tool_desc = f"{i+1}. {name}({params_str}) - {desc}"
-                        tools_description.append(tool_desc)
-                        print(f"Added description for Math tool: {tool_desc}")
-                    except Exception as e:
-                        print(f"Error processing Math tool {i}: {e}")
-                        tools_description.append(f"{i+1}. Error processing tool")
-                
-                # Add Paint tools
-                tools_description.append("\nPAINT TOOLS:")
-                for i, tool in enumerate(paint_tools):
-                    try:
-                        params = tool.inputSchema
-                        desc = getattr(tool, 'description', 'No description available')
-                        name = getattr(tool, 'name', f'tool_{i}')
-                        
-                        if 'properties' in params:
-                            param_details = []
-                            for param_name, param_info in params['properties'].items():
-                                param_type = param_info.get('type', 'unknown')
-                                param_details.append(f"{param_name}: {param_type}")
-                            params_str = ', '.join(param_details)
-                        else:
-                            params_str = 'no parameters'
-
-                        tool_desc = f"{i+1}. {name}({params_str}) - {desc}"
-                        tools_description.append(tool_desc)
-                        print(f"Added description for Paint tool: {tool_desc}")
-                    except Exception as e:
-                        print(f"Error processing Paint tool {i}: {e}")
-                        tools_description.append(f"{i+1}. Error processing tool")
-                
-                # Add Gmail tools
-                tools_description.append("\nGMAIL TOOLS:")
-                for i, tool in enumerate(gmail_tools):
-                    try:
-                            params = tool.inputSchema
-                            desc = getattr(tool, 'description', 'No description available')
-                            name = getattr(tool, 'name', f'tool_{i}')
-                            
-                            if 'properties' in params:
-                                param_details = []
-                                for param_name, param_info in params['properties'].items():
-                                    param_type = param_info.get('type', 'unknown')
-                                    param_details.append(f"{param_name}: {param_type}")
-                                params_str = ', '.join(param_details)
-                            else:
-                                params_str = 'no parameters'
-
-                            tool_desc = f"{i+1}. {name}({params_str}) - {desc}"
-                            tools_description.append(tool_desc)
-                            print(f"Added description for Gmail tool: {tool_desc}")
-                    except Exception as e:
-                        print(f"Error processing Gmail tool {i}: {e}")
-                        tools_description.append(f"{i+1}. Error processing tool")
-                    
-                    tools_description = "\n".join(tools_description)
-                    print("Successfully created tools description")
-                
-                print("Created system prompt...")
-                
-                system_prompt = f"""You are a math agent solving problems in iterations. You have access to various mathematical tools.
-
-Available tools:
-{tools_description}
-
-Respond with EXACTLY ONE of these formats:
-1. For function calls:
-   FUNCTION_CALL: function_name|param1|param2|...
-   The parameters must match the required input types for the function.
-   
-   Example: For add(a: integer, b: integer), use:
-   FUNCTION_CALL: add|5|3
-
-   Example: To open paint open_paint(), use:
-   FUNCTION_CALL: open_paint|
-
-   Example: To draw a rectangle draw_rectangle(x: integer, y: integer, x1: integer, y1: integer), use:
-   FUNCTION_CALL: draw_rectangle|650|420|1050|820   
-
-   Example: To add text in paint add_text(text: str), use:
-   FUNCTION_CALL: add_text|Final answer is 489  
-
-   Example: To send an email send_email(to: str, subject: str, body: str), use:
-   FUNCTION_CALL: send_email|radiantracy@gmail.com|Math Result - Iteration 1|The result of adding 45 and 444 is 489     
-
-2. For final answers:
-   FINAL_ANSWER: [number]
-
-DO NOT include multiple responses. Give ONE response at a time.
-Make sure to provide parameters in the correct order as specified in the function signature."""
-
-                query = """Add 45 and 444. Then draw a rectangle in Paint and add the result inside it. Finally, send an email with the results."""
-                print("Starting iteration loop...")
-                
-                # Use global iteration variables
-                global iteration, last_response
-                
-                while iteration < max_iterations:
-                    print(f"\n--- Iteration {iteration + 1} ---")
-                    if last_response is None:
-                        current_query = query
-                    else:
-                        current_query = current_query + "\n\n" + " ".join(iteration_response)
-                        current_query = current_query + "  What should I do next?"
-
-                    # Get model's response with timeout
-                    print("Preparing to generate LLM response...")
-                    prompt = f"{system_prompt}\n\nQuery: {current_query}"
-                    try:
-                        response = await generate_with_timeout(client, prompt)
-                        response_text = response.text.strip()
-                        print(f"LLM Response: {response_text}")
-                    except Exception as e:
-                        print(f"Failed to get LLM response: {e}")
-                        break
-
-                    if response_text.startswith("FUNCTION_CALL:"):
-                        _, function_info = response_text.split(":", 1)
-                        parts = [p.strip() for p in function_info.split("|")]
-                        func_name, params = parts[0], parts[1:]
-                        
-                        print(f"Calling function {func_name} with params {params}")
-                        try:
-                            # Determine which session to use based on the function name
-                            if func_name in [tool.name for tool in math_tools]:
-                                print("func_name is present in math_tools")
-                                # Find the specific tool with the matching name
-                                matching_tool = None
-                                for tool in math_tools:
-                                    if tool.name == func_name:
-                                        matching_tool = tool
-                                        break
-                                
-                                if matching_tool is None:
-                                    print(f"Error: Could not find tool with name {func_name}")
-                                    continue
-                                
-                                # Prepare arguments according to the tool's input schema
-                                arguments = {}
-                                for (param_name, param_info), value in zip(matching_tool.inputSchema['properties'].items(), params):
-                                    # Convert the value to the correct type based on the schema
-                                    print(f"{param_name}: {param_info}")
-                                    if param_info['type'] == 'integer':
-                                        arguments[param_name] = int(value)
-                                    elif param_info['type'] == 'number':
-                                        arguments[param_name] = float(value)
-                                    elif param_info['type'] == 'array':
-                                        # Handle array types if needed
-                                        arguments[param_name] = eval(value)
-                                    else:
-                                        arguments[param_name] = value
-                                print(f"Executing MCP tool call with arguments: {arguments}")
-                                result = await math_session.call_tool(func_name, arguments=arguments)
-                            elif func_name in [tool.name for tool in paint_tools]:
-                                print("func_name is present in paint_tools")
-                                # Find the specific tool with the matching name
-                                matching_tool = None
-                                for tool in paint_tools:
-                                    if tool.name == func_name:
-                                        matching_tool = tool
-                                        break
-                                
-                                if matching_tool is None:
-                                    print(f"Error: Could not find tool with name {func_name}")
-                                    continue
-                                
-                                # Prepare arguments according to the tool's input schema
-                                arguments = {}
-                                if params and params[0]:  # Only process params if they exist and are not empty
-                                    for (param_name, param_info), value in zip(matching_tool.inputSchema['properties'].items(), params):
-                                        # Convert the value to the correct type based on the schema
-                                        print(f"{param_name}: {param_info}")
-                                        if param_info['type'] == 'integer':
-                                            arguments[param_name] = int(value)
-                                        elif param_info['type'] == 'number':
-                                            arguments[param_name] = float(value)
-                                        elif param_info['type'] == 'array':
-                                            # Handle array types if needed
-                                            arguments[param_name] = eval(value)
-                                        else:
-                                            arguments[param_name] = value
-                                
-                                print(f"Executing MCP tool call with arguments: {arguments}")
-                                result = await paint_session.call_tool(func_name, arguments=arguments)
-                            elif func_name in [tool.name for tool in gmail_tools]:
-                                print("func_name is present in gmail_tools")
-                                # Find the specific tool with the matching name
-                                matching_tool = None
-                                for tool in gmail_tools:
-                                    if tool.name == func_name:
-                                        matching_tool = tool
-                                        break
-                                
-                                if matching_tool is None:
-                                    print(f"Error: Could not find tool with name {func_name}")
-                                    continue
-                                
-                                # Prepare arguments according to the tool's input schema
-                                arguments = {}
-                                if params and params[0]:  # Only process params if they exist and are not empty
-                                    for (param_name, param_info), value in zip(matching_tool.inputSchema['properties'].items(), params):
-                                        # Convert the value to the correct type based on the schema
-                                        print(f"{param_name}: {param_info}")
-                                        if param_info['type'] == 'integer':
-                                            arguments[param_name] = int(value)
-                                        elif param_info['type'] == 'number':
-                                            arguments[param_name] = float(value)
-                                        elif param_info['type'] == 'array':
-                                            # Handle array types if needed
-                                            arguments[param_name] = eval(value)
-                                        else:
-                                            arguments[param_name] = value
-                                
-                                print(f"Executing MCP tool call with arguments: {arguments}")
-                                result = await gmail_session.call_tool(func_name, arguments=arguments)
-                                if func_name == "send_email":
-                                    email_sent = True
-                            else:
-                                print(f"Unknown function: {func_name}")
-                                continue
-                            
-                            print(f"Function call result: {result}")
-                            
-                            # Get the full result content
-                            if hasattr(result, 'content'):
-                                if isinstance(result.content[0], str):
-                                    iteration_result = result.content[0]
-                                else:
-                                    iteration_result = result.content[0].text
-                            else:
-                                iteration_result = str(result)
-                                
-                            print(f"Full result received: {iteration_result}")
-                            
-                            iteration_response.append(
-                                f"In the {iteration + 1} iteration you called {func_name} with {arguments} parameters, "
-                                f"and the function returned {iteration_result}."
-                            )
-                            last_response = iteration_result
-
-                        except Exception as e:
-                            print(f"Error calling tool: {e}")
-                            iteration_response.append(f"Error in iteration {iteration + 1}: {str(e)}")
-                            break
-
-                    elif response_text.startswith("FINAL_ANSWER:"):
-                        print("\n=== Agent Execution Complete ===")
-
-                    iteration += 1
+    return {
+        "final_answer": final_answer,
+        "last_response": last_response,
+        "iterations": iteration,
+        "steps": [step.text for step in conversation.steps],
+        "error": error,
+    }
+
+
+def setup_agents(pool):
+    """Build the tool registry and the per-query tool selector from a started server pool"""
+    math_tools = pool.tools("math")
+    paint_tools = pool.tools("paint")
+    gmail_tools = pool.tools("gmail")
+
+    logger.info("Retrieved %s Math tools, %s Paint tools and %s Gmail tools", len(math_tools), len(paint_tools), len(gmail_tools))
+
+    # Build the tool routing index once
+    registry = ToolRegistry()
+    for handle in pool.available():
+        registry.add_server(handle.name, handle.session, handle.tools)
+    logger.info("Registered %s tools (%s name collisions)", len(registry), len(registry.collisions))
+
+    with tracer.span("tools.index"):
+        selector = ToolSelector(registry, top_k=tool_top_k, parallel=parallel_tool_calls)
+    logger.debug("Full system prompt: ~%s tokens", estimate_tokens(selector.full_prompt))
+    return registry, selector
+
+
+async def main():
+    logger.info("Starting main execution...")
+    try:
+        # Start Math, Paint and Gmail MCP servers concurrently
+        logger.info("Starting MCP servers...")
+        async with ServerPool(DEFAULT_SERVERS) as pool, create_backend() as llm:
+            print(pool.startup_report())
+            registry, selector = setup_agents(pool)
+
+            query = """Add 45 and 444. Then draw a rectangle in Paint and add the result inside it. Finally, send an email with the results."""
+            cache = create_cache()
+            await run_agent(query, registry, llm, selector, cache=cache)
+            if cache is not None:
+                print(f"Tool cache: {cache.stats()}")
+                cache.save()
+        if tracer.enabled:
+            print(format_summary(tracer.summary()))
 
     except Exception as e:
-        print(f"Error in main execution: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in main execution: %s", e)
 
 if __name__ == "__main__":
+    setup_logging("agent")
+    init_tracing("agent")
     asyncio.run(main())
-    
-    
@@ -0,0 +1,84 @@
+import argparse
+import asyncio
+import json
+import time
+
+from dotenv import load_dotenv
+
+from AgenticMCPUse import run_agent, setup_agents
+from llm_backend import create_backend
+from server_pool import ServerPool, DEFAULT_SERVERS
+from tool_cache import create_cache
+from tracing import format_summary, init_tracing, tracer
+from log_setup import setup_logging
+
+
+def load_queries(path):
+    """Read queries from JSONL: either {"id": ..., "query": ...} objects or bare strings"""
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"query": item}
+            item.setdefault("id", str(line_no))
+            queries.append(item)
+    return queries
+
+
+async def run_batch(queries, output_path, concurrency=4):
+    """Run every query as its own agent over one shared server pool, streaming results to JSONL"""
+    semaphore = asyncio.Semaphore(concurrency)
+    completed = 0
+
+    async with ServerPool(DEFAULT_SERVERS) as pool, create_backend() as llm:
+        print(pool.startup_report())
+        registry, selector = setup_agents(pool)
+        cache = create_cache()
+        start = time.monotonic()
+
+        with open(output_path, "w", encoding="utf-8") as out:
+            async def run_one(item):
+                nonlocal completed
+                async with semaphore:
+                    task_start = time.monotonic()
+                    try:
+                        result = await run_agent(item["query"], registry, llm, selector, name=item["id"], cache=cache)
+                    except Exception as e:
+                        result = {"error": f"{type(e).__name__}: {e}"}
+                    result = {"id": item["id"], "query": item["query"], **result,
+                              "seconds": round(time.monotonic() - task_start, 3)}
+
+                # Single-threaded event loop, so whole lines never interleave
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                completed += 1
+
+            await asyncio.gather(*(run_one(item) for item in queries))
+
+        elapsed = time.monotonic() - start
+        if cache is not None:
+            print(f"Tool cache: {cache.stats()}")
+            cache.save()
+        print(f"Completed {completed} tasks in {elapsed:.2f}s ({completed / elapsed:.2f} tasks/s) with concurrency {concurrency}")
+        if tracer.enabled:
+            print(format_summary(tracer.summary()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many agent queries concurrently against one MCP server pool")
+    parser.add_argument("queries", help="JSONL file with one query per line")
+    parser.add_argument("output", help="JSONL file to stream results to")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of agents running at once")
+    args = parser.parse_args()
+
+    load_dotenv()
+    setup_logging("batch")
+    init_tracing("batch")
+    asyncio.run(run_batch(load_queries(args.queries), args.output, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+# Offline benchmark for the agent loop and the three MCP servers.
+# A scripted LLM replays recorded responses, paint uses the headless Pillow
+# canvas and gmail delivers to a local SMTP sink, so runs need no network.
+# Run from the repository root:
+#   python -m benchmarks.run --tasks 8 32 --concurrency 1 4 16 --output results.json
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from dotenv import load_dotenv
+
+from AgenticMCPUse import run_agent, setup_agents
+from llm_backend import FakeBackend, LLMResponse
+from server_pool import DEFAULT_SERVERS, ServerConfig, ServerPool
+from tool_cache import ToolResultCache
+from tracing import summarize, tracer
+from benchmarks.smtp_sink import SMTPSink
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCENARIOS_PATH = os.path.join(os.path.dirname(__file__), "scenarios.json")
+
+
+class ReplayBackend(FakeBackend):
+    """FakeBackend whose scripted responses can reuse values from earlier tool results.
+
+    `captures` maps a placeholder name to a regex; "{name}" in a response is
+    replaced by the last match of that regex in the prompt (e.g. a canvas id).
+    """
+
+    def __init__(self, responses, captures=None, delay: float = 0.0):
+        super().__init__(responses, delay)
+        self.captures = {name: re.compile(pattern) for name, pattern in (captures or {}).items()}
+
+    async def _generate(self, prompt: str, system: str | None = None) -> LLMResponse:
+        response = await super()._generate(prompt, system)
+        text = response.text
+        for name, pattern in self.captures.items():
+            matches = pattern.findall(prompt)
+            if matches:
+                text = text.replace("{" + name + "}", matches[-1])
+        return LLMResponse(text)
+
+
+def server_configs(smtp_port: int, workdir: str) -> list[ServerConfig]:
+    """The default servers, run offline: Pillow canvas, local SMTP sink, scratch queue and caches"""
+    env = {
+        "PAINT_BACKEND": "pillow",
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(smtp_port),
+        "SMTP_STARTTLS": "0",
+        "GMAIL_EMAIL": "bench@example.com",
+        "GMAIL_APP_PASSWORD": "bench",
+        "MAIL_QUEUE_PATH": os.path.join(workdir, "mail_queue.sqlite3"),
+        "THUMBNAIL_CACHE_DIR": os.path.join(workdir, "thumbnails"),
+    }
+    return [ServerConfig(c.name, sys.executable, c.args, {**c.env, **env}) for c in DEFAULT_SERVERS]
+
+
+def peak_rss_mb() -> dict:
+    """Peak resident memory of this process and of the largest exited child (the servers)"""
+    if resource is None:
+        return {"harness": None, "servers": None}
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "harness": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "servers": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+
+def tool_latencies() -> dict:
+    """Round-trip latency per tool from the tool.call spans recorded so far"""
+    durations = {}
+    for span in tracer.spans:
+        if span.name == "tool.call":
+            durations.setdefault(span.attributes["tool"], []).append(span.duration_ms)
+    return summarize(durations)
+
+
+async def measure_startup(configs, runs: int) -> dict:
+    """Cold-start the server pool `runs` times"""
+    totals, per_server = [], {}
+    for _ in range(runs):
+        async with ServerPool(configs) as pool:
+            totals.append(pool.startup_time * 1000)
+            for handle in pool.handles.values():
+                if handle.error:
+                    raise RuntimeError(f"{handle.name} failed to start: {handle.error}")
+                per_server.setdefault(handle.name, []).append(handle.timings["total"] * 1000)
+    return {"pool": summarize({"pool": totals})["pool"], "servers": summarize(per_server)}
+
+
+async def run_level(registry, selector, scenarios, tasks: int, concurrency: int, cache, llm_delay: float) -> dict:
+    """Run `tasks` agents, cycling through the scenarios, at most `concurrency` at a time"""
+    tracer.spans.clear()
+    semaphore = asyncio.Semaphore(concurrency)
+    task_ms, failures = [], []
+
+    async def run_one(index):
+        scenario = scenarios[index % len(scenarios)]
+        llm = ReplayBackend(scenario["responses"], scenario.get("captures"), delay=llm_delay)
+        async with semaphore:
+            start = time.monotonic()
+            result = await run_agent(scenario["query"], registry, llm, selector, name=f"{scenario['name']}-{index}", cache=cache)
+            task_ms.append((time.monotonic() - start) * 1000)
+        if result["error"] or result["final_answer"] is None:
+            failures.append({"scenario": scenario["name"], "error": result["error"], "steps": result["steps"][-2:]})
+
+    start = time.monotonic()
+    await asyncio.gather(*(run_one(i) for i in range(tasks)))
+    elapsed = time.monotonic() - start
+
+    return {
+        "tasks": tasks,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "tasks_per_s": round(tasks / elapsed, 2),
+        "failed": len(failures),
+        "failures": failures[:5],
+        "task_latency_ms": summarize({"task": task_ms})["task"],
+        "llm_latency_ms": tracer.summary().get("llm.generate"),
+        "tool_latency_ms": tool_latencies(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict) -> str:
+    """Throughput and median tool latency against an earlier results file"""
+    previous = {(run["tasks"], run["concurrency"]): run for run in baseline["runs"]}
+    lines = [f"Compared with {baseline.get('commit') or 'baseline'}:"]
+    for run in results["runs"]:
+        old = previous.get((run["tasks"], run["concurrency"]))
+        if old is None:
+            continue
+        change = (run["tasks_per_s"] / old["tasks_per_s"] - 1) * 100 if old["tasks_per_s"] else 0.0
+        lines.append(f"  tasks={run['tasks']} concurrency={run['concurrency']}: "
+                     f"{old['tasks_per_s']} -> {run['tasks_per_s']} tasks/s ({change:+.1f}%)")
+        for tool, stats in run["tool_latency_ms"].items():
+            before = old["tool_latency_ms"].get(tool)
+            if before:
+                lines.append(f"    {tool}: p50 {before['p50_ms']} -> {stats['p50_ms']} ms")
+    return "\n".join(lines)
+
+
+async def run_benchmark(args) -> dict:
+    with open(args.scenarios, encoding="utf-8") as f:
+        scenarios = json.load(f)
+    if args.only:
+        scenarios = [s for s in scenarios if s["name"] in args.only]
+
+    sink = await SMTPSink().start()
+    tracer.enabled = True
+    try:
+        with tempfile.TemporaryDirectory(prefix="mcp-bench-") as workdir:
+            configs = server_configs(sink.port, workdir)
+            startup = await measure_startup(configs, args.startup_runs)
+            print(f"Startup: pool p50 {startup['pool']['p50_ms']:.0f} ms over {args.startup_runs} runs")
+
+            runs = []
+            async with ServerPool(configs) as pool:
+                registry, selector = setup_agents(pool)
+                cache = ToolResultCache() if args.cache else None
+                for tasks in args.tasks:
+                    for concurrency in args.concurrency:
+                        run = await run_level(registry, selector, scenarios, tasks, concurrency, cache, args.llm_delay)
+                        runs.append(run)
+                        print(f"tasks={tasks:<4} concurrency={concurrency:<3} {run['tasks_per_s']:>8.2f} tasks/s  "
+                              f"task p50 {run['task_latency_ms']['p50_ms']:.1f} ms  p95 {run['task_latency_ms']['p95_ms']:.1f} ms  "
+                              f"failed {run['failed']}")
+    finally:
+        await sink.close()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scenarios": [s["name"] for s in scenarios],
+        "llm_delay_s": args.llm_delay,
+        "cache": args.cache,
+        "startup_ms": startup,
+        "runs": runs,
+        "emails_delivered": sink.messages,
+        # Servers have exited by now, so their peak is included
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the agent loop and MCP servers offline")
+    parser.add_argument("--tasks", type=int, nargs="+", default=[8, 32], help="Agent runs per level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Agents running at once")
+    parser.add_argument("--scenarios", default=SCENARIOS_PATH, help="JSON file of recorded scenarios")
+    parser.add_argument("--only", nargs="+", help="Run only these scenario names")
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="Simulated LLM latency in seconds")
+    parser.add_argument("--startup-runs", type=int, default=3, help="Cold starts of the server pool to time")
+    parser.add_argument("--cache", action="store_true", help="Enable the tool result cache")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the results JSON")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    load_dotenv()
+    results = asyncio.run(run_benchmark(args))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Peak RSS: {results['peak_rss_mb']}")
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            print(compare(results, json.load(f)))
+
+
+if __name__ == "__main__":
+    main()
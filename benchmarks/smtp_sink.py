@@ -0,0 +1,52 @@
+# Minimal local SMTP server that accepts and discards mail, so gmail_server
+# can be benchmarked without network access or credentials. It speaks just
+# enough SMTP for smtplib: no AUTH or STARTTLS is advertised.
+import asyncio
+
+
+class SMTPSink:
+    """Counts messages delivered to it; start() binds a free port on localhost"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.messages = 0
+        self.connections = 0
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        writer.write(b"220 localhost sink ready\r\n")
+        try:
+            while line := await reader.readline():
+                command = line[:4].upper()
+                if command == b"EHLO":
+                    writer.write(b"250-localhost\r\n250 8BITMIME\r\n")
+                elif command == b"DATA":
+                    writer.write(b"354 end with <CRLF>.<CRLF>\r\n")
+                    await writer.drain()
+                    while (await reader.readline()) not in (b".\r\n", b".\n", b""):
+                        pass
+                    self.messages += 1
+                    writer.write(b"250 OK queued\r\n")
+                elif command == b"QUIT":
+                    writer.write(b"221 bye\r\n")
+                    break
+                else:
+                    # HELO, MAIL, RCPT, NOOP and RSET all just succeed
+                    writer.write(b"250 OK\r\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
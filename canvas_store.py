@@ -0,0 +1,103 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from paint_backends import PaintBackend
+
+
+@dataclass
+class Canvas:
+    """One open drawing session owned by a single client"""
+    id: str
+    backend: PaintBackend
+    lock: asyncio.Lock
+    created: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class CanvasStore:
+    """Open canvases keyed by id, least recently used first.
+
+    Opening more than `max_canvases` evicts the least recently used one,
+    and canvases idle for longer than `idle_timeout` seconds (0 = never)
+    are closed on the next open. Each canvas has its own lock so
+    commands from one client never interleave; backends that share the
+    desktop's mouse and keyboard (mspaint) all use one lock instead.
+    """
+
+    def __init__(self, factory, max_canvases: int = 16, idle_timeout: float = 600.0):
+        self.factory = factory
+        self.max_canvases = max_canvases
+        self.idle_timeout = idle_timeout
+        self.canvases: OrderedDict[str, Canvas] = OrderedDict()
+        self.evicted = 0
+        self._input_lock = asyncio.Lock()
+
+    async def open(self) -> Canvas:
+        """Create and open a new canvas, making room for it first"""
+        await self.evict_idle()
+        while len(self.canvases) >= self.max_canvases:
+            oldest = next(iter(self.canvases))
+            await self.close(oldest)
+            self.evicted += 1
+
+        backend = self.factory()
+        await backend.open()
+        lock = self._input_lock if backend.shares_input else asyncio.Lock()
+        canvas = Canvas(uuid.uuid4().hex[:12], backend, lock)
+        self.canvases[canvas.id] = canvas
+        return canvas
+
+    def get(self, canvas_id: str) -> Canvas:
+        """Look up a canvas and mark it as recently used"""
+        canvas = self.canvases.get(canvas_id)
+        if canvas is None:
+            raise ValueError(f"Unknown canvas {canvas_id!r}; it may have been closed or evicted. Call open_paint to get a new one.")
+        canvas.last_used = time.monotonic()
+        self.canvases.move_to_end(canvas_id)
+        return canvas
+
+    async def close(self, canvas_id: str) -> bool:
+        canvas = self.canvases.pop(canvas_id, None)
+        if canvas is None:
+            return False
+        # Wait for any command still drawing on it
+        async with canvas.lock:
+            await canvas.backend.close()
+        return True
+
+    async def evict_idle(self) -> int:
+        if not self.idle_timeout:
+            return 0
+        cutoff = time.monotonic() - self.idle_timeout
+        idle = [cid for cid, canvas in self.canvases.items() if canvas.last_used < cutoff]
+        for cid in idle:
+            await self.close(cid)
+        self.evicted += len(idle)
+        return len(idle)
+
+    async def close_all(self):
+        for cid in list(self.canvases):
+            await self.close(cid)
+
+    def memory_report(self) -> dict:
+        """Per-canvas memory and idle time, most recently used last"""
+        now = time.monotonic()
+        canvases = [
+            {
+                "canvas_id": canvas.id,
+                "backend": canvas.backend.name,
+                "memory_bytes": canvas.backend.memory_bytes(),
+                "idle_seconds": round(now - canvas.last_used, 1),
+            }
+            for canvas in self.canvases.values()
+        ]
+        return {
+            "open": len(canvases),
+            "max_canvases": self.max_canvases,
+            "evicted": self.evicted,
+            "total_memory_bytes": sum(c["memory_bytes"] for c in canvases),
+            "canvases": canvases,
+        }
@@ -0,0 +1,78 @@
+from dataclasses import dataclass, field
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token), no tokenizer needed"""
+    return (len(text) + 3) // 4
+
+
+@dataclass
+class Step:
+    """One agent step: the full description and a one-line summary of it"""
+    text: str
+    summary: str
+
+
+@dataclass
+class Conversation:
+    """Query plus step history, each step appended exactly once.
+
+    render() keeps the newest steps verbatim while they fit in
+    context_budget tokens; older steps are collapsed into a single
+    summary line, and dropped entirely if even that does not fit.
+    A budget of 0 disables the limit.
+    """
+    query: str
+    context_budget: int = 0
+    steps: list = field(default_factory=list)
+    last_render_tokens: int = 0
+    summarized_steps: int = 0
+
+    def add_step(self, text: str, summary: str | None = None) -> None:
+        self.steps.append(Step(text, summary or text))
+
+    def render(self) -> str:
+        """Build the query text for the next iteration"""
+        if not self.steps:
+            self.last_render_tokens = estimate_tokens(self.query)
+            self.summarized_steps = 0
+            return self.query
+
+        budget = self.context_budget or float("inf")
+        used = estimate_tokens(self.query)
+
+        # Walk back from the newest step, keeping full text while it fits
+        recent = []
+        index = len(self.steps)
+        while index > 0:
+            cost = estimate_tokens(self.steps[index - 1].text)
+            if recent and used + cost > budget:
+                break
+            recent.append(self.steps[index - 1].text)
+            used += cost
+            index -= 1
+        recent.reverse()
+
+        # Summarize whatever did not fit, newest summaries first
+        summaries = []
+        for step in reversed(self.steps[:index]):
+            cost = estimate_tokens(step.summary)
+            if used + cost > budget:
+                break
+            summaries.append(step.summary)
+            used += cost
+        summaries.reverse()
+        self.summarized_steps = index
+
+        parts = [self.query]
+        if index:
+            dropped = index - len(summaries)
+            header = f"Earlier steps ({index}) in short:"
+            if dropped:
+                header += f" {dropped} oldest omitted."
+            parts.append(" ".join([header] + summaries))
+        parts.append(" ".join(recent) + "  What should I do next?")
+
+        text = "\n\n".join(parts)
+        self.last_render_tokens = estimate_tokens(text)
+        return text
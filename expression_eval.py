@@ -0,0 +1,207 @@
+# Safe arithmetic expression evaluation for math_server's evaluate tool.
+# Expressions are parsed with ast, checked against a small whitelist and
+# compiled once into nested closures; nothing is ever passed to eval.
+import ast
+import math
+import operator
+from functools import lru_cache, reduce
+
+import numpy as np
+
+import math_kernels
+
+
+class ExpressionError(ValueError):
+    """An expression that is malformed or uses something not allowed"""
+
+
+def _checked_power(a, b, max_digits):
+    if isinstance(a, int) and isinstance(b, int):
+        if b < 0:
+            return a ** b
+        digits = math_kernels.power_digits(a, b)
+        if digits > max_digits:
+            raise ExpressionError(f"power result would have about {digits} digits, above the limit of {max_digits}")
+    return a ** b
+
+
+def _checked_factorial(a, max_digits):
+    if isinstance(a, float):
+        if not a.is_integer():
+            raise ExpressionError("factorial needs an integer")
+        a = int(a)
+    if a < 0:
+        raise ExpressionError("factorial is not defined for negative numbers")
+    digits = math_kernels.factorial_digits(a)
+    if digits > max_digits:
+        raise ExpressionError(f"factorial result would have about {digits} digits, above the limit of {max_digits}")
+    return math.factorial(a)
+
+
+# The same primitives math_server exposes as individual tools
+SCALAR_FUNCTIONS = {
+    "add": operator.add,
+    "subtract": operator.sub,
+    "multiply": operator.mul,
+    "divide": operator.truediv,
+    "remainder": operator.mod,
+    "mine": lambda a, b: a - b - b,
+    "sqrt": math.sqrt,
+    "cbrt": lambda a: math.copysign(abs(a) ** (1 / 3), a),
+    "log": math.log,
+    "exp": math.exp,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "abs": abs,
+    "min": min,
+    "max": max,
+}
+
+VECTOR_FUNCTIONS = {
+    **SCALAR_FUNCTIONS,
+    "sqrt": np.sqrt,
+    "cbrt": np.cbrt,
+    "log": np.log,
+    "exp": np.exp,
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+    "abs": np.abs,
+    # np.minimum(a, b, c) would take c as the output array
+    "min": lambda *args: reduce(np.minimum, args),
+    "max": lambda *args: reduce(np.maximum, args),
+}
+
+CONSTANTS = {"pi": math.pi, "e": math.e}
+
+_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+}
+
+_UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+
+def _compile_node(node, variables: set):
+    """Turn one AST node into a closure taking (env, functions)"""
+    if isinstance(node, ast.Constant):
+        if not isinstance(node.value, (int, float)) or isinstance(node.value, bool):
+            raise ExpressionError(f"unsupported constant {node.value!r}")
+        value = node.value
+        return lambda env, funcs: value
+
+    if isinstance(node, ast.Name):
+        name = node.id
+        if name in CONSTANTS:
+            value = CONSTANTS[name]
+            return lambda env, funcs: value
+        variables.add(name)
+        return lambda env, funcs: env[name]
+
+    if isinstance(node, ast.BinOp):
+        left = _compile_node(node.left, variables)
+        right = _compile_node(node.right, variables)
+        if isinstance(node.op, ast.Pow):
+            return lambda env, funcs: funcs["power"](left(env, funcs), right(env, funcs))
+        op = _BINARY_OPS.get(type(node.op))
+        if op is None:
+            raise ExpressionError(f"unsupported operator {type(node.op).__name__}")
+        return lambda env, funcs: op(left(env, funcs), right(env, funcs))
+
+    if isinstance(node, ast.UnaryOp):
+        op = _UNARY_OPS.get(type(node.op))
+        if op is None:
+            raise ExpressionError(f"unsupported operator {type(node.op).__name__}")
+        operand = _compile_node(node.operand, variables)
+        return lambda env, funcs: op(operand(env, funcs))
+
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.keywords:
+            raise ExpressionError("only plain calls like sqrt(x) are allowed")
+        name = node.func.id
+        if name not in VECTOR_FUNCTIONS and name not in ("power", "factorial"):
+            raise ExpressionError(f"unknown function {name!r}")
+        args = [_compile_node(arg, variables) for arg in node.args]
+        return lambda env, funcs: funcs[name](*(arg(env, funcs) for arg in args))
+
+    raise ExpressionError(f"unsupported syntax {type(node).__name__}")
+
+
+@lru_cache(maxsize=256)
+def compile_expression(expression: str):
+    """Parse and compile an expression once; returns (closure, variable names)"""
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"invalid expression: {e.msg}") from None
+    variables = set()
+    closure = _compile_node(tree.body, variables)
+    return closure, frozenset(variables)
+
+
+def evaluate(expression: str, variables: dict | None = None, max_digits: int = 4000):
+    """Evaluate an expression with scalar variables, or over arrays of values.
+
+    If any variable is a list, every list must have the same length and
+    the expression is evaluated for all of them at once with NumPy,
+    returning a list of floats.
+    """
+    closure, names = compile_expression(expression)
+    variables = variables or {}
+    missing = names - variables.keys()
+    if missing:
+        raise ExpressionError(f"missing values for variables {sorted(missing)}")
+
+    vector = any(isinstance(value, (list, tuple)) for value in variables.values())
+    if not vector:
+        funcs = {
+            **SCALAR_FUNCTIONS,
+            "power": lambda a, b: _checked_power(a, b, max_digits),
+            "factorial": lambda a: _checked_factorial(a, max_digits),
+        }
+        try:
+            result = closure(variables, funcs)
+        except ZeroDivisionError:
+            raise ExpressionError("division by zero") from None
+        except ExpressionError:
+            raise
+        except (ValueError, OverflowError, TypeError) as e:
+            raise ExpressionError(str(e)) from None
+        # (-8) ** 0.5 is complex and inf or nan have no JSON form; neither can be returned
+        if isinstance(result, complex):
+            raise ExpressionError("result is not a real number")
+        if isinstance(result, float) and not math.isfinite(result):
+            raise ExpressionError(f"result is {result}")
+        return result
+
+    env = {name: np.asarray(value, dtype=np.float64) for name, value in variables.items()}
+    lengths = {array.size for array in env.values() if array.ndim}
+    if len(lengths) > 1:
+        raise ExpressionError("all variable lists must have the same length")
+    funcs = {
+        **VECTOR_FUNCTIONS,
+        # Integer literals stay Python ints; in float64 a large power becomes inf instead of wrapping around in int64
+        "power": lambda a, b: np.power(np.float64(a), b),
+        "factorial": lambda a: np.vectorize(lambda v: float(_checked_factorial(v, max_digits)))(a),
+    }
+    try:
+        with np.errstate(all="ignore"):
+            result = closure(env, funcs)
+    except ZeroDivisionError:
+        raise ExpressionError("division by zero") from None
+    except ExpressionError:
+        raise
+    except (ValueError, OverflowError, TypeError) as e:
+        raise ExpressionError(str(e)) from None
+    result = np.broadcast_to(result, (lengths.pop(),))
+    bad = ~np.isfinite(result)
+    if bad.any():
+        index = int(np.argmax(bad))
+        at = ", ".join(f"{name}={array.flat[index]}" for name, array in env.items() if array.ndim)
+        raise ExpressionError(f"result is {result[index]} at index {index} ({at})")
+    return result.tolist()
@@ -1,40 +1,115 @@
 from mcp.server.fastmcp import FastMCP
 from mcp.types import TextContent
 import smtplib
+import asyncio
+import json
+from string import Template
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
-import logging
-from datetime import datetime
 from dotenv import load_dotenv
+from smtp_pool import SMTPPool
+from mail_queue import MailQueue
+from log_setup import setup_logging
+from tracing import instrument_server
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-log_dir = "logs"
-if not os.path.exists(log_dir):
-    os.makedirs(log_dir)
-
-log_file = os.path.join(log_dir, f"gmail_server_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
+# Log to stderr and a rotating file, off the request path
+logger = setup_logging("gmail_server", default_file=os.path.join("logs", "gmail_server.log"))
 
 # Initialize MCP server
 logger.info("Initializing Gmail MCP server")
 mcp = FastMCP("GmailController")
+instrument_server(mcp, "gmail")
+
+# SMTP settings, overridable so tests can point at a local SMTP server
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") != "0"
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+
+# Keep-alive SMTP connections, created on the first send
+smtp_pool = None
+
+def get_smtp_pool(gmail_email: str, gmail_password: str) -> SMTPPool:
+    """Return the shared SMTP pool, recreating it if the credentials changed"""
+    global smtp_pool
+    if smtp_pool is None or (smtp_pool.username, smtp_pool.password) != (gmail_email, gmail_password):
+        if smtp_pool is not None:
+            smtp_pool.close()
+        smtp_pool = SMTPPool(SMTP_HOST, SMTP_PORT, gmail_email, gmail_password,
+                             starttls=SMTP_STARTTLS, size=SMTP_POOL_SIZE)
+    return smtp_pool
+
+# Durable queue for bulk sends, delivered in the background
+MAIL_QUEUE_PATH = os.getenv("MAIL_QUEUE_PATH", os.path.join("queue", "mail_queue.sqlite3"))
+queue_dir = os.path.dirname(MAIL_QUEUE_PATH)
+if queue_dir and not os.path.exists(queue_dir):
+    os.makedirs(queue_dir)
+
+SEND_BATCH_SIZE = int(os.getenv("SEND_BATCH_SIZE", "20"))
+SEND_RATE_PER_SECOND = float(os.getenv("SEND_RATE_PER_SECOND", "5"))
+
+mail_queue = MailQueue(MAIL_QUEUE_PATH)
+delivery_task = None
+
+def build_message(from_email: str, to_email: str, subject: str, body: str) -> str:
+    """Create the MIME text of a plain-text email"""
+    msg = MIMEMultipart()
+    msg['From'] = from_email
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    return msg.as_string()
+
+async def deliver_queued_emails():
+    """Send pending queued emails in batches on one pooled connection, rate limited"""
+    gmail_email = os.getenv("GMAIL_EMAIL")
+    gmail_password = os.getenv("GMAIL_APP_PASSWORD")
+    pool = get_smtp_pool(gmail_email, gmail_password)
+    loop = asyncio.get_running_loop()
+
+    while True:
+        batch = mail_queue.next_batch(SEND_BATCH_SIZE)
+        if not batch:
+            break
+        started = loop.time()
+        logger.info("Delivering batch of %s queued emails", len(batch))
+        results = await pool.send_batch(
+            gmail_email,
+            [([to_email], build_message(gmail_email, to_email, subject, body)) for _, to_email, subject, body in batch],
+        )
+
+        sent = [row[0] for row, error in zip(batch, results) if error is None]
+        mail_queue.mark_sent(sent)
+        for row, error in zip(batch, results):
+            if error is not None:
+                logger.error("Failed to send queued email %s to %s: %s", row[0], row[1], error)
+                # Rejected messages and bad credentials will not succeed on retry
+                retry = not isinstance(error, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused))
+                mail_queue.mark_failed(row[0], str(error), retry=retry)
+
+        if len(sent) < len(batch):
+            await asyncio.sleep(1)  # back off before retrying after failures
+
+        # Spread sends so we stay under SEND_RATE_PER_SECOND
+        if SEND_RATE_PER_SECOND > 0:
+            remaining = len(batch) / SEND_RATE_PER_SECOND - (loop.time() - started)
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+
+def ensure_delivery_worker():
+    """Start the background delivery task if there is queued mail and none is running"""
+    global delivery_task
+    if (delivery_task is None or delivery_task.done()) and mail_queue.has_pending():
+        delivery_task = asyncio.create_task(deliver_queued_emails())
 
 @mcp.tool()
 async def send_email(to_email: str, subject: str, body: str) -> dict:
     """Send an email using Gmail SMTP"""
-    logger.info(f"Tool called: send_email(to_email={to_email}, subject={subject})")
+    logger.info("Tool called: send_email(to_email=%s, subject=%s)", to_email, subject)
     try:
         # Get Gmail credentials from environment variables
         gmail_email = os.getenv("GMAIL_EMAIL")
@@ -60,26 +135,12 @@ For Gmail, you need to create an App Password:
                 ]
             }
         
-        logger.info(f"Preparing to send email to {to_email}")
+        logger.info("Preparing to send email to %s", to_email)
         
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = gmail_email
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        # Add body
-        msg.attach(MIMEText(body, 'plain'))
-        
-        # Connect to Gmail SMTP server
-        logger.info("Connecting to Gmail SMTP server")
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        
-        # Login
-        logger.info("Logging in to Gmail account")
+        # Send over a pooled connection, off the event loop
+        logger.info("Sending email")
         try:
-            server.login(gmail_email, gmail_password)
+            await get_smtp_pool(gmail_email, gmail_password).send(gmail_email, [to_email], build_message(gmail_email, to_email, subject, body))
         except smtplib.SMTPAuthenticationError as auth_error:
             error_msg = f"""Error: Gmail authentication failed. Please check your credentials.
             
@@ -98,15 +159,7 @@ For instructions on creating an App Password, see the README.md file."""
                 ]
             }
         
-        # Send email
-        logger.info("Sending email")
-        text = msg.as_string()
-        server.sendmail(gmail_email, to_email, text)
-        
-        # Close connection
-        server.quit()
-        
-        logger.info(f"Email sent successfully to {to_email}")
+        logger.info("Email sent successfully to %s", to_email)
         return {
             "content": [
                 TextContent(
@@ -133,6 +186,82 @@ If you're having trouble with Gmail authentication:
             ]
         }
 
+@mcp.tool()
+async def send_emails_bulk(messages: list[dict] | None = None, template: dict | None = None,
+                           recipients: list[dict] | None = None) -> dict:
+    """Queue many emails for background delivery and return a job id right away.
+    Pass messages as [{"to_email", "subject", "body"}], or a template {"subject", "body"} using $name
+    placeholders plus recipients [{"to_email", ...values}]. Check progress with get_send_status"""
+    logger.info("Tool called: send_emails_bulk(messages=%s, recipients=%s)", len(messages or []), len(recipients or []))
+    try:
+        if not os.getenv("GMAIL_EMAIL") or not os.getenv("GMAIL_APP_PASSWORD"):
+            error_msg = "Error: Gmail credentials not found. Please set GMAIL_EMAIL and GMAIL_APP_PASSWORD in your .env file."
+            logger.error(error_msg)
+            return {
+                "content": [
+                    TextContent(
+                        type="text",
+                        text=error_msg
+                    )
+                ]
+            }
+
+        queued = list(messages or [])
+        if template is not None:
+            subject = Template(template.get("subject", ""))
+            body = Template(template.get("body", ""))
+            for recipient in recipients or []:
+                queued.append({
+                    "to_email": recipient["to_email"],
+                    "subject": subject.safe_substitute(recipient),
+                    "body": body.safe_substitute(recipient),
+                })
+        for message in queued:
+            missing = {"to_email", "subject", "body"} - message.keys()
+            if missing:
+                raise ValueError(f"message {message!r} is missing {sorted(missing)}")
+        if not queued:
+            raise ValueError("no messages to send: pass messages, or a template with recipients")
+
+        job_id = mail_queue.enqueue(queued)
+        ensure_delivery_worker()
+        logger.info("Queued %s emails as job %s", len(queued), job_id)
+        return {
+            "content": [
+                TextContent(
+                    type="text",
+                    text=f"Queued {len(queued)} emails as job {job_id}"
+                )
+            ]
+        }
+    except Exception as e:
+        logger.error("Error queueing emails: %s", e)
+        return {
+            "content": [
+                TextContent(
+                    type="text",
+                    text=f"Error queueing emails: {str(e)}"
+                )
+            ]
+        }
+
+@mcp.tool()
+async def get_send_status(job_id: str) -> dict:
+    """Report how many emails of a bulk job are sent, failed or still pending"""
+    logger.info("Tool called: get_send_status(job_id=%s)", job_id)
+    # Resume delivery left over from a previous server run
+    ensure_delivery_worker()
+    status = mail_queue.job_status(job_id)
+    text = json.dumps(status) if status is not None else f"Unknown job id {job_id}"
+    return {
+        "content": [
+            TextContent(
+                type="text",
+                text=text
+            )
+        ]
+    }
+
 if __name__ == "__main__":
     logger.info("Starting Gmail MCP server")
     mcp.run(transport="stdio")
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+from dataclasses import dataclass
+
+
+@dataclass
+class LLMResponse:
+    """Text returned by an LLM backend"""
+    text: str
+
+
+class LLMBackend:
+    """Async LLM interface with bounded concurrency and cancellable timeouts.
+
+    Subclasses implement _generate(). generate() runs it as a coroutine,
+    so a timeout cancels the request itself instead of leaving a worker
+    thread and its HTTP connection busy. `system` is the system prompt,
+    kept apart from the prompt so providers can cache it as a prefix.
+    """
+
+    def __init__(self, max_concurrency: int = 4):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def generate(self, prompt: str, timeout: float = 10, system: str | None = None) -> LLMResponse:
+        async with self._semaphore:
+            return await asyncio.wait_for(self._generate(prompt, system), timeout=timeout)
+
+    async def _generate(self, prompt: str, system: str | None = None) -> LLMResponse:
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+class GeminiBackend(LLMBackend):
+    """Gemini through the native async client over a pooled keep-alive HTTP client"""
+
+    def __init__(self, api_key: str, model: str = "gemini-2.0-flash", max_concurrency: int = 4):
+        super().__init__(max_concurrency)
+        import httpx
+        from google import genai
+        from google.genai import types
+
+        self.types = types
+        self.model = model
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        )
+        self.client = genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(httpx_async_client=self._http),
+        )
+
+    async def _generate(self, prompt: str, system: str | None = None) -> LLMResponse:
+        # An identical system instruction on every request is a shared prefix Gemini caches implicitly
+        config = self.types.GenerateContentConfig(system_instruction=system) if system else None
+        response = await self.client.aio.models.generate_content(model=self.model, contents=prompt, config=config)
+        return LLMResponse(response.text or "")
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+class FakeBackend(LLMBackend):
+    """Offline backend that replays scripted responses in order.
+
+    Once the script runs out it keeps answering with `default`.
+    """
+
+    def __init__(self, responses, delay: float = 0.0, default: str = "FINAL_ANSWER: [done]", max_concurrency: int = 4):
+        super().__init__(max_concurrency)
+        self.responses = list(responses)
+        self.delay = delay
+        self.default = default
+        self.prompts = []
+
+    async def _generate(self, prompt: str, system: str | None = None) -> LLMResponse:
+        self.prompts.append(f"{system}\n\n{prompt}" if system else prompt)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        index = len(self.prompts) - 1
+        return LLMResponse(self.responses[index] if index < len(self.responses) else self.default)
+
+
+def load_script(path: str) -> list[str]:
+    """Read scripted responses from a JSON list or a file with one response per line"""
+    with open(path, encoding="utf-8") as f:
+        content = f.read()
+    if content.lstrip().startswith("["):
+        return json.loads(content)
+    return [line for line in content.splitlines() if line.strip()]
+
+
+def create_backend() -> LLMBackend:
+    """Pick the backend from LLM_BACKEND (gemini or fake)"""
+    max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+    if os.getenv("LLM_BACKEND", "gemini") == "fake":
+        script = os.getenv("FAKE_LLM_SCRIPT")
+        return FakeBackend(load_script(script) if script else [], max_concurrency=max_concurrency)
+    return GeminiBackend(os.getenv("GEMINI_API_KEY"), max_concurrency=max_concurrency)
@@ -0,0 +1,88 @@
+# Shared logging for the agent and the MCP servers.
+# Records go through a queue to a background listener thread, so callers
+# never wait on formatting or I/O. Output goes to stderr and optionally a
+# size-rotated file, never to stdout, which is the stdio servers' JSON-RPC
+# channel. Log with %-style arguments (logger.info("x=%s", x)) so messages
+# below the configured level are never formatted.
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+# Attributes every LogRecord has; anything else was passed via extra= and goes into JSON output
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any extra= fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Queue the record as is; the listener thread merges the arguments and formats it"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(service: str, default_file: str | None = None) -> logging.Logger:
+    """Route all logging through a queue to stderr and, if configured, a rotating file.
+
+    LOG_LEVEL sets the level (default INFO), LOG_FORMAT=json switches to
+    JSON lines, and LOG_FILE (default `default_file`, empty to disable)
+    names the file, rotated at LOG_MAX_BYTES with LOG_BACKUP_COUNT old
+    copies. Returns the logger for `service`.
+    """
+    global _listener
+    if _listener is not None:
+        return logging.getLogger(service)
+
+    if os.getenv("LOG_FORMAT", "text") == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    handlers = [logging.StreamHandler(sys.stderr)]
+    log_file = os.getenv("LOG_FILE", default_file or "")
+    if log_file:
+        directory = os.path.dirname(log_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+            backupCount=int(os.getenv("LOG_BACKUP_COUNT", "3")),
+            encoding="utf-8",
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers[:] = [LazyQueueHandler(log_queue)]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    # The MCP library logs every request at INFO; keep that for debugging only
+    if not root.isEnabledFor(logging.DEBUG):
+        logging.getLogger("mcp").setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # Flush whatever is still queued when the process exits
+    atexit.register(_listener.stop)
+    return logging.getLogger(service)
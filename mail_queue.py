@@ -0,0 +1,96 @@
+import sqlite3
+import time
+import uuid
+
+
+class MailQueue:
+    """Durable on-disk queue of outgoing emails, grouped into jobs.
+
+    Messages survive a server restart and are picked up again by the
+    delivery worker. Used only from the event loop thread.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        self.max_attempts = max_attempts
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                created REAL NOT NULL,
+                total INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL REFERENCES jobs(id),
+                to_email TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                body TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS messages_status ON messages(status, id);
+            CREATE INDEX IF NOT EXISTS messages_job ON messages(job_id);
+        """)
+        self.db.commit()
+
+    def enqueue(self, messages: list[dict]) -> str:
+        """Store messages (to_email, subject, body) as a new job and return its id"""
+        job_id = uuid.uuid4().hex
+        with self.db:
+            self.db.execute("INSERT INTO jobs (id, created, total) VALUES (?, ?, ?)", (job_id, time.time(), len(messages)))
+            self.db.executemany(
+                "INSERT INTO messages (job_id, to_email, subject, body) VALUES (?, ?, ?, ?)",
+                [(job_id, m["to_email"], m["subject"], m["body"]) for m in messages],
+            )
+        return job_id
+
+    def next_batch(self, limit: int) -> list[tuple]:
+        """Oldest pending messages as (id, to_email, subject, body)"""
+        return self.db.execute(
+            "SELECT id, to_email, subject, body FROM messages WHERE status = 'pending' ORDER BY id LIMIT ?",
+            (limit,),
+        ).fetchall()
+
+    def has_pending(self) -> bool:
+        return self.db.execute("SELECT 1 FROM messages WHERE status = 'pending' LIMIT 1").fetchone() is not None
+
+    def mark_sent(self, message_ids: list[int]) -> None:
+        with self.db:
+            self.db.executemany("UPDATE messages SET status = 'sent', attempts = attempts + 1, error = NULL WHERE id = ?",
+                                [(i,) for i in message_ids])
+
+    def mark_failed(self, message_id: int, error: str, retry: bool = True) -> None:
+        """Record a failed attempt; the message stays pending until it runs out of attempts"""
+        with self.db:
+            self.db.execute(
+                """UPDATE messages SET attempts = attempts + 1, error = ?,
+                   status = CASE WHEN ? AND attempts + 1 < ? THEN 'pending' ELSE 'failed' END
+                   WHERE id = ?""",
+                (error, retry, self.max_attempts, message_id),
+            )
+
+    def job_status(self, job_id: str) -> dict | None:
+        job = self.db.execute("SELECT total, created FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if job is None:
+            return None
+        counts = dict(self.db.execute(
+            "SELECT status, COUNT(*) FROM messages WHERE job_id = ? GROUP BY status", (job_id,)
+        ).fetchall())
+        errors = [row[0] for row in self.db.execute(
+            "SELECT DISTINCT error FROM messages WHERE job_id = ? AND status = 'failed' LIMIT 5", (job_id,)
+        )]
+        pending = counts.get("pending", 0)
+        return {
+            "job_id": job_id,
+            "total": job[0],
+            "sent": counts.get("sent", 0),
+            "failed": counts.get("failed", 0),
+            "pending": pending,
+            "status": "in_progress" if pending else "done",
+            "errors": errors,
+        }
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,121 @@
+# CPU-heavy math used by math_server.
+# Functions are module-level so they can be sent to a process pool, and
+# they never print: worker processes must stay off the stdio channel.
+import base64
+import math
+
+import numpy as np
+
+LOG10_PHI = math.log10((1 + 5 ** 0.5) / 2)
+
+
+def factorial_digits(a: int) -> int:
+    """Number of decimal digits in a!"""
+    if a < 2:
+        return 1
+    return int(math.lgamma(a + 1) / math.log(10)) + 1
+
+
+def power_digits(a: int, b: int) -> int:
+    """Upper bound on the number of decimal digits in a ** b"""
+    if b <= 0 or a in (0, 1, -1):
+        return 1
+    return int(b * math.log10(abs(a))) + 1
+
+
+def fibonacci_digits(n: int) -> int:
+    """Approximate number of decimal digits in the n-th Fibonacci number"""
+    return max(1, int(n * LOG10_PHI))
+
+
+def factorial(a: int) -> int:
+    return math.factorial(a)
+
+
+def power(a: int, b: int) -> int:
+    return a ** b
+
+
+def fibonacci_pair(n: int) -> tuple[int, int]:
+    """(F(n), F(n+1)) by fast doubling, O(log n) multiplications"""
+    if n == 0:
+        return 0, 1
+    a, b = fibonacci_pair(n >> 1)
+    c = a * (2 * b - a)
+    d = a * a + b * b
+    if n & 1:
+        return d, c + d
+    return c, d
+
+
+def fibonacci(n: int) -> int:
+    return fibonacci_pair(n)[0]
+
+
+def fibonacci_range(start: int, stop: int) -> list[int]:
+    """[F(start), ..., F(stop - 1)] without computing the numbers before start"""
+    if stop <= start:
+        return []
+    a, b = fibonacci_pair(start)
+    numbers = []
+    for _ in range(stop - start):
+        numbers.append(a)
+        a, b = b, a + b
+    return numbers
+
+
+# Vectorized operations over arrays of floats
+MAP_OPS = {
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+    "sqrt": np.sqrt,
+    "cbrt": np.cbrt,
+    "log": np.log,
+    "exp": np.exp,
+    "abs": np.abs,
+    "square": np.square,
+    "negate": np.negative,
+}
+
+REDUCE_OPS = {
+    "sum": np.sum,
+    "prod": np.prod,
+    "min": np.min,
+    "max": np.max,
+    "mean": np.mean,
+    "std": np.std,
+    "exp_sum": lambda values: np.exp(values).sum(),
+}
+
+
+def decode_values(values: list | None, data: str | None, dtype: str = "float64") -> np.ndarray:
+    """Array from a JSON list or a base64 buffer of little-endian numbers"""
+    if (values is None) == (data is None):
+        raise ValueError("pass exactly one of values or data")
+    if data is not None:
+        return np.frombuffer(base64.b64decode(data), dtype=np.dtype(dtype).newbyteorder("<")).astype(np.float64)
+    return np.asarray(values, dtype=np.float64)
+
+
+def encode_values(array: np.ndarray) -> str:
+    """Base64 buffer of little-endian float64 values"""
+    return base64.b64encode(array.astype("<f8").tobytes()).decode("ascii")
+
+
+def check_finite(name: str, values: np.ndarray, result) -> None:
+    """Raise ValueError if result holds NaN or inf, which JSON cannot carry, naming the input behind it"""
+    result = np.asarray(result)
+    bad = ~np.isfinite(result)
+    if not bad.any():
+        return
+    if result.shape == values.shape:
+        index = int(np.argmax(bad.ravel()))
+        raise ValueError(f"{name} is {result.flat[index]} for value {values.flat[index]} at index {index}")
+    if values.size == 0:
+        raise ValueError(f"{name} is undefined for an empty list")
+    bad_inputs = np.flatnonzero(~np.isfinite(values))
+    if bad_inputs.size:
+        raise ValueError(f"{name} is {result.flat[0]}: value at index {bad_inputs[0]} is {values.flat[bad_inputs[0]]}")
+    largest = values.flat[int(np.argmax(np.abs(values)))]
+    raise ValueError(f"{name} is {result.flat[0]}, outside the float64 range (largest value {largest})")
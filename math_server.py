@@ -1,147 +1,304 @@
 # basic import 
 from mcp.server.fastmcp import FastMCP, Image
 from mcp.server.fastmcp.prompts import base
-from PIL import Image as PILImage
+from mcp.types import ToolAnnotations
+import asyncio
+import logging
 import math
+import os
+import sys
+import expression_eval
+import math_kernels
+import numpy as np
+from result_pages import PageStore
+from thumbnails import ThumbnailCache
+from log_setup import setup_logging
+from worker_pool import WorkerDied, WorkerPool
+from tracing import instrument_server
+# Never print: stdout is the stdio transport's JSON-RPC channel
+logger = logging.getLogger("math_server")
+
 # instantiate an MCP server client
 mcp = FastMCP("Calculator")
 
+# Pure tools: same arguments always give the same result, so clients may cache them
+PURE = ToolAnnotations(readOnlyHint=True, idempotentHint=True, openWorldHint=False)
+
+# Limits for CPU-heavy tools, so one request cannot stall the server
+MAX_DIGITS = int(os.getenv("MATH_MAX_DIGITS", "4000"))
+MAX_ITEMS = int(os.getenv("MATH_MAX_ITEMS", "1000"))
+TASK_TIMEOUT = float(os.getenv("MATH_TASK_TIMEOUT", "10"))
+WORKERS = int(os.getenv("MATH_WORKERS", "2"))
+# Results up to this many digits are cheap enough to compute inline
+INLINE_DIGITS = 1000
+# List results are sent this many items at a time; next_page returns the rest
+PAGE_SIZE = int(os.getenv("MATH_PAGE_SIZE", "200"))
+
+pages = PageStore(PAGE_SIZE)
+
+# Integers are serialized as decimal text, which Python caps by default
+if MAX_DIGITS >= sys.get_int_max_str_digits():
+    sys.set_int_max_str_digits(MAX_DIGITS + 1)
+
+# Heavy computations run here, one per worker process, so a runaway one can be stopped alone
+workers = WorkerPool(WORKERS)
+thumbnail_cache = None
+
+def get_thumbnail_cache():
+    """Create the cache of encoded thumbnails, reused until the source file changes, on first use"""
+    global thumbnail_cache
+    if thumbnail_cache is None:
+        thumbnail_cache = ThumbnailCache(
+            os.getenv("THUMBNAIL_CACHE_DIR", os.path.join("cache", "thumbnails")),
+            max_files=int(os.getenv("THUMBNAIL_CACHE_FILES", "2048")),
+            workers=int(os.getenv("THUMBNAIL_WORKERS", "4")),
+        )
+    return thumbnail_cache
+
+def check_digits(name: str, digits: int):
+    if digits > MAX_DIGITS:
+        raise ValueError(f"{name} result would have about {digits} digits, above the limit of {MAX_DIGITS} (MATH_MAX_DIGITS)")
+
+async def run_heavy(digits: int, func, *args):
+    """Run a kernel inline if its result is small, otherwise in a worker process with a time limit"""
+    if digits <= INLINE_DIGITS:
+        return func(*args)
+    try:
+        return await workers.run(TASK_TIMEOUT, func, *args)
+    except asyncio.TimeoutError:
+        raise ValueError(f"computation exceeded the {TASK_TIMEOUT}s time limit (MATH_TASK_TIMEOUT)")
+    except WorkerDied:
+        # e.g. killed for memory; the next call starts a fresh worker
+        raise ValueError("the worker process running the computation died")
+
 # DEFINE TOOLS
 
 #addition tool
-@mcp.tool()
+@mcp.tool(annotations=PURE)
 def add(a: int, b: int) -> int:
     """Add two numbers"""
-    print("CALLED: add(a: int, b: int) -> int:")
+    logger.debug("CALLED: add(a: int, b: int) -> int:")
     return int(a + b)
 
-@mcp.tool()
+@mcp.tool(annotations=PURE)
 def add_list(l: list) -> int:
     """Add all numbers in a list"""
-    print("CALLED: add(l: list) -> int:")
+    logger.debug("CALLED: add(l: list) -> int:")
     return sum(l)
 
 # subtraction tool
-@mcp.tool()
+@mcp.tool(annotations=PURE)
 def subtract(a: int, b: int) -> int:
     """Subtract two numbers"""
-    print("CALLED: subtract(a: int, b: int) -> int:")
+    logger.debug("CALLED: subtract(a: int, b: int) -> int:")
     return int(a - b)
 
 # multiplication tool
-@mcp.tool()
+@mcp.tool(annotations=PURE)
 def multiply(a: int, b: int) -> int:
     """Multiply two numbers"""
-    print("CALLED: multiply(a: int, b: int) -> int:")
+    logger.debug("CALLED: multiply(a: int, b: int) -> int:")
     return int(a * b)
 
 #  division tool
-@mcp.tool() 
+@mcp.tool(annotations=PURE) 
 def divide(a: int, b: int) -> float:
     """Divide two numbers"""
-    print("CALLED: divide(a: int, b: int) -> float:")
+    logger.debug("CALLED: divide(a: int, b: int) -> float:")
     return float(a / b)
 
 # power tool
-@mcp.tool()
-def power(a: int, b: int) -> int:
+@mcp.tool(annotations=PURE)
+async def power(a: int, b: int) -> int:
     """Power of two numbers"""
-    print("CALLED: power(a: int, b: int) -> int:")
-    return int(a ** b)
+    logger.debug("CALLED: power(a: int, b: int) -> int:")
+    if b < 0:
+        raise ValueError("power only supports non-negative exponents")
+    digits = math_kernels.power_digits(a, b)
+    check_digits("power", digits)
+    return await run_heavy(digits, math_kernels.power, a, b)
 
 # square root tool
-@mcp.tool()
+@mcp.tool(annotations=PURE)
 def sqrt(a: int) -> float:
     """Square root of a number"""
-    print("CALLED: sqrt(a: int) -> float:")
+    logger.debug("CALLED: sqrt(a: int) -> float:")
     return float(a ** 0.5)
 
 # cube root tool
-@mcp.tool()
+@mcp.tool(annotations=PURE)
 def cbrt(a: int) -> float:
     """Cube root of a number"""
-    print("CALLED: cbrt(a: int) -> float:")
+    logger.debug("CALLED: cbrt(a: int) -> float:")
     return float(a ** (1/3))
 
 # factorial tool
-@mcp.tool()
-def factorial(a: int) -> int:
+@mcp.tool(annotations=PURE)
+async def factorial(a: int) -> int:
     """factorial of a number"""
-    print("CALLED: factorial(a: int) -> int:")
-    return int(math.factorial(a))
+    logger.debug("CALLED: factorial(a: int) -> int:")
+    if a < 0:
+        raise ValueError("factorial is not defined for negative numbers")
+    digits = math_kernels.factorial_digits(a)
+    check_digits("factorial", digits)
+    return await run_heavy(digits, math_kernels.factorial, a)
 
 # log tool
-@mcp.tool()
+@mcp.tool(annotations=PURE)
 def log(a: int) -> float:
     """log of a number"""
-    print("CALLED: log(a: int) -> float:")
+    logger.debug("CALLED: log(a: int) -> float:")
     return float(math.log(a))
 
 # remainder tool
-@mcp.tool()
+@mcp.tool(annotations=PURE)
 def remainder(a: int, b: int) -> int:
     """remainder of two numbers divison"""
-    print("CALLED: remainder(a: int, b: int) -> int:")
+    logger.debug("CALLED: remainder(a: int, b: int) -> int:")
     return int(a % b)
 
 # sin tool
-@mcp.tool()
+@mcp.tool(annotations=PURE)
 def sin(a: int) -> float:
     """sin of a number"""
-    print("CALLED: sin(a: int) -> float:")
+    logger.debug("CALLED: sin(a: int) -> float:")
     return float(math.sin(a))
 
 # cos tool
-@mcp.tool()
+@mcp.tool(annotations=PURE)
 def cos(a: int) -> float:
     """cos of a number"""
-    print("CALLED: cos(a: int) -> float:")
+    logger.debug("CALLED: cos(a: int) -> float:")
     return float(math.cos(a))
 
 # tan tool
-@mcp.tool()
+@mcp.tool(annotations=PURE)
 def tan(a: int) -> float:
     """tan of a number"""
-    print("CALLED: tan(a: int) -> float:")
+    logger.debug("CALLED: tan(a: int) -> float:")
     return float(math.tan(a))
 
 # mine tool
-@mcp.tool()
+@mcp.tool(annotations=PURE)
 def mine(a: int, b: int) -> int:
     """special mining tool"""
-    print("CALLED: mine(a: int, b: int) -> int:")
+    logger.debug("CALLED: mine(a: int, b: int) -> int:")
     return int(a - b - b)
 
 @mcp.tool()
-def create_thumbnail(image_path: str) -> Image:
-    """Create a thumbnail from an image"""
-    print("CALLED: create_thumbnail(image_path: str) -> Image:")
-    img = PILImage.open(image_path)
-    img.thumbnail((100, 100))
-    return Image(data=img.tobytes(), format="png")
+async def create_thumbnail(image_path: str, size: int = 100, format: str = "png") -> Image:
+    """Create a thumbnail from an image, at most size pixels on each side, as png, webp or jpeg"""
+    logger.debug("CALLED: create_thumbnail(image_path: str) -> Image:")
+    data = await get_thumbnail_cache().fetch(image_path, size, format)
+    return Image(data=data, format=format)
 
 @mcp.tool()
-def strings_to_chars_to_int(string: str) -> list[int]:
-    """Return the ASCII values of the characters in a word"""
-    print("CALLED: strings_to_chars_to_int(string: str) -> list[int]:")
-    return [int(ord(char)) for char in string]
+async def create_thumbnails(image_paths: list[str], size: int = 100, format: str = "png") -> list:
+    """Create thumbnails for several images at once; a failed image gives an error message in its place"""
+    logger.debug("CALLED: create_thumbnails(image_paths: list) -> list:")
+    results = await get_thumbnail_cache().fetch_many(image_paths, size, format)
+    return [
+        f"Error creating thumbnail for {path}: {result}" if isinstance(result, Exception) else Image(data=result, format=format)
+        for path, result in zip(image_paths, results)
+    ]
 
-@mcp.tool()
+@mcp.tool(annotations=PURE)
+async def strings_to_chars_to_int(string: str) -> dict:
+    """Return the ASCII values of the characters in a word, one page at a time (see next_page)"""
+    logger.debug("CALLED: strings_to_chars_to_int(string: str) -> list[int]:")
+    return await pages.from_list([int(ord(char)) for char in string])
+
+@mcp.tool(annotations=PURE)
 def int_list_to_exponential_sum(int_list: list) -> float:
     """Return sum of exponentials of numbers in a list"""
-    print("CALLED: int_list_to_exponential_sum(int_list: list) -> float:")
-    return sum(math.exp(i) for i in int_list)
+    logger.debug("CALLED: int_list_to_exponential_sum(int_list: list) -> float:")
+    array = np.asarray(int_list, dtype=np.float64)
+    with np.errstate(all="ignore"):
+        result = np.exp(array).sum()
+    math_kernels.check_finite("int_list_to_exponential_sum", array, result)
+    return float(result)
+
+@mcp.tool(annotations=PURE)
+async def fibonacci_numbers(n: int, mode: str = "all", offset: int = 0, limit: int = 0) -> dict | int:
+    """Return the first n Fibonacci Numbers. mode="last" returns only the n-th number;
+    mode="all" returns the numbers from offset on, limit (default 200) per page; pass next_cursor to next_page for more"""
+    logger.debug("CALLED: fibonacci_numbers(n: int) -> list:")
+    if mode == "last":
+        if n <= 0:
+            raise ValueError("n must be positive for mode='last'")
+        digits = math_kernels.fibonacci_digits(n - 1)
+        check_digits("fibonacci_numbers", digits)
+        return await run_heavy(digits, math_kernels.fibonacci, n - 1)
+    if mode != "all":
+        raise ValueError(f"unknown mode {mode!r}, expected 'all' or 'last'")
+
+    if limit < 0:
+        raise ValueError("limit must not be negative")
+    if limit > MAX_ITEMS:
+        raise ValueError(f"limit {limit} is above the page size limit of {MAX_ITEMS} (MATH_MAX_ITEMS)")
+    offset = max(offset, 0)
+    # The largest number decides whether any page can be computed at all
+    check_digits("fibonacci_numbers", math_kernels.fibonacci_digits(max(n - 1, 0)))
+
+    async def fetch(start: int, stop: int) -> list[int]:
+        # Computed lazily, one page per request; the page's largest number decides where
+        digits = math_kernels.fibonacci_digits(offset + stop - 1)
+        return await run_heavy(digits, math_kernels.fibonacci_range, offset + start, offset + stop)
+
+    return await pages.first_page(max(n - offset, 0), fetch, limit)
 
 @mcp.tool()
-def fibonacci_numbers(n: int) -> list:
-    """Return the first n Fibonacci Numbers"""
-    print("CALLED: fibonacci_numbers(n: int) -> list:")
-    if n <= 0:
-        return []
-    fib_sequence = [0, 1]
-    for _ in range(2, n):
-        fib_sequence.append(fib_sequence[-1] + fib_sequence[-2])
-    return fib_sequence[:n]
+async def next_page(cursor: str) -> dict:
+    """Return the next page of a paged result, given the next_cursor from the previous page"""
+    logger.debug("CALLED: next_page(cursor: str) -> dict:")
+    return await pages.next_page(cursor)
+
+@mcp.tool(annotations=PURE)
+def map_op(op: str, values: list[float] | None = None, data: str | None = None, dtype: str = "float64", output: str = "list") -> list[float] | str:
+    """Apply op (sin, cos, tan, sqrt, cbrt, log, exp, abs, square, negate) to every value.
+    Input is a JSON list in values or a base64 buffer of little-endian numbers in data;
+    output="base64" returns a base64 float64 buffer, needed above 1000 values, which may hold NaN and inf"""
+    logger.debug("CALLED: map_op(op: str, values: list) -> list:")
+    if op not in math_kernels.MAP_OPS:
+        raise ValueError(f"unknown op {op!r}, expected one of {sorted(math_kernels.MAP_OPS)}")
+    array = math_kernels.decode_values(values, data, dtype)
+    with np.errstate(all="ignore"):
+        result = math_kernels.MAP_OPS[op](array)
+    if output == "base64":
+        return math_kernels.encode_values(result)
+    if output != "list":
+        raise ValueError(f"unknown output {output!r}, expected 'list' or 'base64'")
+    math_kernels.check_finite(f"map_op {op}", array, result)
+    if result.size > MAX_ITEMS:
+        raise ValueError(f"{result.size} values is above the list limit of {MAX_ITEMS} (MATH_MAX_ITEMS), use output='base64'")
+    return result.tolist()
+
+@mcp.tool(annotations=PURE)
+def reduce_op(op: str, values: list[float] | None = None, data: str | None = None, dtype: str = "float64") -> float:
+    """Reduce all values with op (sum, prod, min, max, mean, std, exp_sum).
+    Input is a JSON list in values or a base64 buffer of little-endian numbers in data"""
+    logger.debug("CALLED: reduce_op(op: str, values: list) -> float:")
+    if op not in math_kernels.REDUCE_OPS:
+        raise ValueError(f"unknown op {op!r}, expected one of {sorted(math_kernels.REDUCE_OPS)}")
+    array = math_kernels.decode_values(values, data, dtype)
+    if array.size == 0 and op in ("min", "max", "mean", "std"):
+        raise ValueError(f"{op} of an empty list is undefined")
+    with np.errstate(all="ignore"):
+        result = math_kernels.REDUCE_OPS[op](array)
+    math_kernels.check_finite(f"reduce_op {op}", array, result)
+    return float(result)
+
+@mcp.tool(annotations=PURE)
+def evaluate(expression: str, variables: dict[str, float | list[float]] | None = None) -> int | float | list[float]:
+    """Evaluate an arithmetic expression in one call, e.g. "log((45 + 444) ** 2)".
+    Supports + - * / // % **, pi, e and the functions add, subtract, multiply, divide, power, sqrt, cbrt,
+    factorial, log, exp, remainder, sin, cos, tan, mine, abs, min, max.
+    variables maps names to numbers, or to equal-length lists to evaluate at many points at once"""
+    logger.debug("CALLED: evaluate(expression: str, variables: dict) -> float:")
+    for value in (variables or {}).values():
+        if isinstance(value, list) and len(value) > MAX_ITEMS:
+            raise ValueError(f"{len(value)} values is above the list limit of {MAX_ITEMS} (MATH_MAX_ITEMS), use map_op with a base64 buffer")
+    return expression_eval.evaluate(expression, variables, max_digits=MAX_DIGITS)
 
 # DEFINE RESOURCES
 
@@ -149,7 +306,7 @@ def fibonacci_numbers(n: int) -> list:
 @mcp.resource("greeting://{name}")
 def get_greeting(name: str) -> str:
     """Get a personalized greeting"""
-    print("CALLED: get_greeting(name: str) -> str:")
+    logger.debug("CALLED: get_greeting(name: str) -> str:")
     return f"Hello, {name}!"
 
 
@@ -157,7 +314,7 @@ def get_greeting(name: str) -> str:
 @mcp.prompt()
 def review_code(code: str) -> str:
     return f"Please review this code:\n\n{code}"
-    print("CALLED: review_code(code: str) -> str:")
+    logger.debug("CALLED: review_code(code: str) -> str:")
 
 
 @mcp.prompt()
@@ -168,7 +325,11 @@ def debug_error(error: str) -> list[base.Message]:
         base.AssistantMessage("I'll help debug that. What have you tried so far?"),
     ]
 
+# Spawned pool workers re-run this file as __mp_main__ to start up, so logging
+# and tracing are only set up here, in the server process itself
 if __name__ == "__main__":
-    print("Starting Math MCP server")
+    setup_logging("math_server", default_file=os.path.join("logs", "math_server.log"))
+    instrument_server(mcp, "math")
+    logger.info("Starting Math MCP server")
     mcp.run(transport="stdio")
-    print("Gmail Math server stopped") 
+    logger.info("Math MCP server stopped")
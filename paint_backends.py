@@ -0,0 +1,201 @@
+import io
+import logging
+import os
+import sys
+from functools import lru_cache
+
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+from readiness import LatencyProfile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FONT = "DejaVuSans.ttf"
+DEFAULT_FONT_SIZE = 24
+# Where text goes when no position is given, matching the spot mspaint's text box was clicked
+DEFAULT_TEXT_POSITION = (810, 533)
+
+# Display list primitives for draw_batch: op -> (required fields, optional fields)
+DRAW_COMMANDS = {
+    "rect": (("x1", "y1", "x2", "y2"), ("color",)),
+    "line": (("x1", "y1", "x2", "y2"), ("color",)),
+    "ellipse": (("x1", "y1", "x2", "y2"), ("color",)),
+    "text": (("text",), ("x", "y", "font", "size", "color")),
+    "fill": (("x", "y"), ("color",)),
+}
+
+
+def parse_commands(commands: list[dict]) -> list[tuple[str, dict]]:
+    """Validate a display list up front so a bad command fails before anything is drawn"""
+    parsed = []
+    for index, command in enumerate(commands):
+        if not isinstance(command, dict) or command.get("op") not in DRAW_COMMANDS:
+            raise ValueError(f"command {index}: expected an object with op in {sorted(DRAW_COMMANDS)}, got {command!r}")
+        op = command["op"]
+        required, optional = DRAW_COMMANDS[op]
+        missing = [field for field in required if field not in command]
+        if missing:
+            raise ValueError(f"command {index} ({op}): missing {missing}")
+        unknown = set(command) - set(required) - set(optional) - {"op"}
+        if unknown:
+            raise ValueError(f"command {index} ({op}): unknown fields {sorted(unknown)}")
+        args = {}
+        for field in required + optional:
+            if field not in command:
+                continue
+            value = command[field]
+            args[field] = str(value) if field in ("text", "font", "color") else int(value)
+        parsed.append((op, args))
+    return parsed
+
+
+@lru_cache(maxsize=32)
+def load_font(font: str | None, size: int):
+    """TrueType font by file or family name, falling back to Pillow's built-in font; cached per (font, size)"""
+    try:
+        return ImageFont.truetype(font or DEFAULT_FONT, size)
+    except OSError:
+        logger.warning("Font %r not found, using the built-in font", font or DEFAULT_FONT)
+        return ImageFont.load_default(size)
+
+
+class PaintBackend:
+    """Drawing operations behind the paint_server tools.
+
+    Coordinates are canvas pixels. Methods raise on failure; the tools
+    turn exceptions into error messages for the client.
+    """
+
+    name = "base"
+    # Waits the backend needs between GUI steps; zero means it is always ready
+    profile = LatencyProfile()
+    # Drives shared desktop input, so only one canvas may draw at a time
+    shares_input = False
+
+    async def open(self) -> None:
+        raise NotImplementedError
+
+    async def draw_rectangle(self, x1: int, y1: int, x2: int, y2: int, color: str = "black") -> None:
+        raise NotImplementedError
+
+    async def add_text(self, text: str, x: int | None = None, y: int | None = None,
+                       font: str | None = None, size: int = DEFAULT_FONT_SIZE, color: str = "black") -> None:
+        """Write the whole string in one operation with its top-left corner at (x, y)"""
+        raise NotImplementedError
+
+    async def draw_line(self, x1: int, y1: int, x2: int, y2: int, color: str = "black") -> None:
+        raise NotImplementedError
+
+    async def draw_ellipse(self, x1: int, y1: int, x2: int, y2: int, color: str = "black") -> None:
+        raise NotImplementedError
+
+    async def fill(self, x: int, y: int, color: str = "black") -> None:
+        raise NotImplementedError
+
+    async def draw_batch(self, commands: list[tuple[str, dict]]) -> int:
+        """Execute a parsed display list in order; returns how many commands ran.
+
+        Backends with expensive per-call setup override this to do that
+        setup once per batch.
+        """
+        methods = {
+            "rect": self.draw_rectangle,
+            "line": self.draw_line,
+            "ellipse": self.draw_ellipse,
+            "text": self.add_text,
+            "fill": self.fill,
+        }
+        for done, (op, args) in enumerate(commands):
+            try:
+                await methods[op](**args)
+            except Exception as e:
+                raise RuntimeError(f"command {done} ({op}) failed after {done} commands: {e}") from e
+        return len(commands)
+
+    def get_png(self) -> bytes:
+        """Current canvas as PNG bytes"""
+        raise NotImplementedError
+
+    def memory_bytes(self) -> int:
+        """Memory held by this canvas in the server process"""
+        return 0
+
+    async def close(self) -> None:
+        pass
+
+
+class PillowCanvasBackend(PaintBackend):
+    """Headless in-memory canvas rendered with Pillow; works on any platform"""
+
+    name = "pillow"
+
+    def __init__(self, width: int = 1920, height: int = 1080, background: str = "white"):
+        self.width = width
+        self.height = height
+        self.background = background
+        self.image = None
+        self.draw = None
+
+    async def open(self) -> None:
+        self.image = Image.new("RGB", (self.width, self.height), self.background)
+        self.draw = ImageDraw.Draw(self.image)
+
+    def _require_open(self):
+        if self.image is None:
+            raise RuntimeError("Canvas is not open. Please call open_paint first.")
+
+    @staticmethod
+    def _box(x1, y1, x2, y2):
+        return (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+
+    async def draw_rectangle(self, x1: int, y1: int, x2: int, y2: int, color: str = "black") -> None:
+        self._require_open()
+        self.draw.rectangle(self._box(x1, y1, x2, y2), outline=color, width=2)
+
+    async def add_text(self, text: str, x: int | None = None, y: int | None = None,
+                       font: str | None = None, size: int = DEFAULT_FONT_SIZE, color: str = "black") -> None:
+        self._require_open()
+        position = DEFAULT_TEXT_POSITION if x is None or y is None else (x, y)
+        self.draw.text(position, text, fill=color, font=load_font(font, size))
+
+    async def draw_line(self, x1: int, y1: int, x2: int, y2: int, color: str = "black") -> None:
+        self._require_open()
+        self.draw.line((x1, y1, x2, y2), fill=color, width=2)
+
+    async def draw_ellipse(self, x1: int, y1: int, x2: int, y2: int, color: str = "black") -> None:
+        self._require_open()
+        self.draw.ellipse(self._box(x1, y1, x2, y2), outline=color, width=2)
+
+    async def fill(self, x: int, y: int, color: str = "black") -> None:
+        self._require_open()
+        ImageDraw.floodfill(self.image, (x, y), ImageColor.getrgb(color))
+
+    def get_png(self) -> bytes:
+        self._require_open()
+        buffer = io.BytesIO()
+        self.image.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    def memory_bytes(self) -> int:
+        if self.image is None:
+            return 0
+        return self.image.width * self.image.height * len(self.image.getbands())
+
+    async def close(self) -> None:
+        self.image = None
+        self.draw = None
+
+
+def create_backend(name: str | None = None) -> PaintBackend:
+    """Build the backend named by PAINT_BACKEND: mspaint on Windows, pillow elsewhere by default"""
+    name = name or os.getenv("PAINT_BACKEND") or ("mspaint" if sys.platform == "win32" else "pillow")
+    logger.info("Using paint backend: %s", name)
+    if name == "pillow":
+        size = os.getenv("PAINT_CANVAS_SIZE", "1920x1080")
+        width, height = (int(v) for v in size.lower().split("x"))
+        return PillowCanvasBackend(width, height)
+    if name == "mspaint":
+        # Windows-only dependencies, imported only when this backend is used
+        from paint_win32 import MSPaintBackend
+        return MSPaintBackend()
+    raise ValueError(f"Unknown paint backend {name!r}, expected 'pillow' or 'mspaint'")
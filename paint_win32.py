@@ -0,0 +1,229 @@
+from pywinauto.application import Application
+import win32gui
+import win32con
+import io
+import logging
+from win32api import GetSystemMetrics
+
+from paint_backends import DEFAULT_FONT_SIZE, DEFAULT_TEXT_POSITION, PaintBackend
+from readiness import LatencyProfile, settle, wait_until
+
+logger = logging.getLogger(__name__)
+
+# Characters pywinauto's type_keys treats as key codes or modifiers
+SEND_KEYS_SPECIAL = str.maketrans({c: "{" + c + "}" for c in "{}+^%~()"})
+
+# Ribbon button positions in the default Paint layout
+TOOL_COORDS = {
+    "text": (290, 72),
+    "fill": (250, 72),
+    "line": (380, 65),
+    "ellipse": (410, 65),
+    "rect": (440, 65),
+}
+
+# Paint's window state is polled; only tool selection and typing need fixed settle time
+MSPAINT_PROFILE = LatencyProfile(
+    launch_timeout=10.0,
+    focus_timeout=2.0,
+    after_tool_select=0.2,
+    after_click=0.1,
+    poll_interval=0.05,
+)
+
+
+class MSPaintBackend(PaintBackend):
+    """Drives Microsoft Paint through the Windows GUI"""
+
+    name = "mspaint"
+    profile = MSPAINT_PROFILE
+    shares_input = True
+
+    def __init__(self):
+        self.paint_app = None
+        # Ribbon tool currently selected, so repeated shapes skip the click
+        self.current_tool = None
+
+    async def wait_foreground(self, handle):
+        """Wait until Paint is restored and in the foreground"""
+        await wait_until(
+            lambda: not win32gui.IsIconic(handle) and win32gui.GetForegroundWindow() == handle,
+            self.profile.focus_timeout,
+            self.profile.poll_interval,
+            "Paint window to become active",
+        )
+
+    async def ensure_paint_active(self):
+        """Ensure the Paint window is active and visible"""
+        if not self.paint_app:
+            raise RuntimeError("Paint is not open. Please call open_paint first.")
+
+        # Get the Paint window
+        paint_window = self.paint_app.window(class_name='MSPaintApp')
+        handle = paint_window.handle
+
+        # Nothing to do if it is already in front
+        if not win32gui.IsIconic(handle) and win32gui.GetForegroundWindow() == handle:
+            return paint_window
+
+        # Someone else had focus and may have changed the selected tool
+        self.current_tool = None
+
+        # Check if the window is minimized and restore it if needed
+        if win32gui.IsIconic(handle):
+            logger.info("Paint window is minimized, restoring it")
+            win32gui.ShowWindow(handle, win32con.SW_RESTORE)
+
+        # Ensure the window is active and in the foreground
+        logger.info("Ensuring Paint window is active and in the foreground")
+        win32gui.SetForegroundWindow(handle)
+        win32gui.BringWindowToTop(handle)
+        await self.wait_foreground(handle)
+        return paint_window
+
+    async def open(self) -> None:
+        logger.info("Starting Microsoft Paint application")
+        self.paint_app = Application().start('mspaint.exe')
+
+        # Wait until the Paint window is up rather than sleeping a fixed time
+        logger.info("Waiting for Paint window")
+        paint_window = self.paint_app.window(class_name='MSPaintApp')
+        await wait_until(
+            lambda: paint_window.exists(timeout=0) and paint_window.is_visible(),
+            self.profile.launch_timeout,
+            self.profile.poll_interval,
+            "Paint window to open",
+        )
+
+        # Get primary monitor width
+        primary_width = GetSystemMetrics(0)
+        logger.info("Primary monitor width: %s", primary_width)
+
+        # Ensure the window is active and in the foreground
+        logger.info("Ensuring Paint window is active and in the foreground")
+        win32gui.SetForegroundWindow(paint_window.handle)
+
+        # Bring the window to the top
+        logger.info("Bringing Paint window to the top")
+        win32gui.BringWindowToTop(paint_window.handle)
+
+        # Set the window to be topmost temporarily to ensure it's visible
+        logger.info("Setting Paint window to be topmost temporarily")
+        win32gui.SetWindowPos(
+            paint_window.handle,
+            win32con.HWND_TOPMOST,
+            0, 0, 0, 0,
+            win32con.SWP_NOMOVE | win32con.SWP_NOSIZE
+        )
+
+        # Set the window back to normal (not topmost)
+        logger.info("Setting Paint window back to normal")
+        win32gui.SetWindowPos(
+            paint_window.handle,
+            win32con.HWND_NOTOPMOST,
+            0, 0, 0, 0,
+            win32con.SWP_NOMOVE | win32con.SWP_NOSIZE
+        )
+        await self.wait_foreground(paint_window.handle)
+
+    async def select_tool(self, paint_window, tool: str):
+        """Click a ribbon tool unless it is already selected"""
+        if self.current_tool == tool:
+            return
+        logger.info("Clicking on %s tool", tool)
+        paint_window.click_input(coords=TOOL_COORDS[tool])
+        await settle(self.profile.after_tool_select)
+        self.current_tool = tool
+
+    async def drag_shape(self, paint_window, canvas, tool: str, x1: int, y1: int, x2: int, y2: int):
+        await self.select_tool(paint_window, tool)
+        logger.info("Drawing %s from (%s, %s) to (%s, %s)", tool, x1, y1, x2, y2)
+        canvas.press_mouse_input(coords=(x1, y1))
+        canvas.move_mouse_input(coords=(x2, y2))
+        canvas.release_mouse_input(coords=(x2, y2))
+
+    async def draw_rectangle(self, x1: int, y1: int, x2: int, y2: int, color: str = "black") -> None:
+        # Paint draws with its currently selected color
+        paint_window = await self.ensure_paint_active()
+        canvas = paint_window.child_window(class_name='MSPaintView')
+        await self.drag_shape(paint_window, canvas, "rect", x1, y1, x2, y2)
+
+    async def draw_line(self, x1: int, y1: int, x2: int, y2: int, color: str = "black") -> None:
+        paint_window = await self.ensure_paint_active()
+        canvas = paint_window.child_window(class_name='MSPaintView')
+        await self.drag_shape(paint_window, canvas, "line", x1, y1, x2, y2)
+
+    async def draw_ellipse(self, x1: int, y1: int, x2: int, y2: int, color: str = "black") -> None:
+        paint_window = await self.ensure_paint_active()
+        canvas = paint_window.child_window(class_name='MSPaintView')
+        await self.drag_shape(paint_window, canvas, "ellipse", x1, y1, x2, y2)
+
+    async def fill(self, x: int, y: int, color: str = "black") -> None:
+        paint_window = await self.ensure_paint_active()
+        canvas = paint_window.child_window(class_name='MSPaintView')
+        await self.select_tool(paint_window, "fill")
+        canvas.click_input(coords=(x, y))
+
+    async def draw_batch(self, commands: list[tuple[str, dict]]) -> int:
+        """Focus Paint and resolve the canvas once, then run every command"""
+        paint_window = await self.ensure_paint_active()
+        canvas = paint_window.child_window(class_name='MSPaintView')
+        for done, (op, args) in enumerate(commands):
+            try:
+                if op in ("rect", "line", "ellipse"):
+                    await self.drag_shape(paint_window, canvas, op, args["x1"], args["y1"], args["x2"], args["y2"])
+                elif op == "fill":
+                    await self.select_tool(paint_window, "fill")
+                    canvas.click_input(coords=(args["x"], args["y"]))
+                else:
+                    await self.type_text(paint_window, canvas, args["text"], args.get("x"), args.get("y"))
+            except Exception as e:
+                raise RuntimeError(f"command {done} ({op}) failed after {done} commands: {e}") from e
+        return len(commands)
+
+    async def add_text(self, text: str, x: int | None = None, y: int | None = None,
+                       font: str | None = None, size: int = DEFAULT_FONT_SIZE, color: str = "black") -> None:
+        # Font, size and color come from whatever Paint's text toolbar has selected
+        paint_window = await self.ensure_paint_active()
+        canvas = paint_window.child_window(class_name='MSPaintView')
+        await self.type_text(paint_window, canvas, text, x, y)
+
+    async def type_text(self, paint_window, canvas, text: str, x: int | None, y: int | None):
+        # Click on the Text tool
+        await self.select_tool(paint_window, "text")
+
+        # Select text tool using keyboard shortcuts
+        logger.info("Selecting text tool using keyboard shortcuts")
+        paint_window.type_keys('t')
+        await settle(self.profile.after_tool_select)
+        paint_window.type_keys('x')
+
+        # Click where to start typing
+        logger.info("Clicking where to start typing")
+        canvas.click_input(coords=DEFAULT_TEXT_POSITION if x is None or y is None else (x, y))
+        await settle(self.profile.after_click)
+
+        # Type the whole text in one call; spaces and newlines are sent as keys
+        logger.info("Typing text: '%s'", text)
+        paint_window.type_keys(text.translate(SEND_KEYS_SPECIAL), with_spaces=True, with_newlines=True)
+        await settle(self.profile.after_click)
+
+        # Click to exit text mode
+        logger.info("Clicking to exit text mode")
+        canvas.click_input(coords=(1050, 800))
+        # Leaving text mode drops back to the selection tool
+        self.current_tool = None
+
+    def get_png(self) -> bytes:
+        if not self.paint_app:
+            raise RuntimeError("Paint is not open. Please call open_paint first.")
+        # Screenshot of the canvas control
+        canvas = self.paint_app.window(class_name='MSPaintApp').child_window(class_name='MSPaintView')
+        buffer = io.BytesIO()
+        canvas.capture_as_image().save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    async def close(self) -> None:
+        if self.paint_app:
+            self.paint_app.kill()
+            self.paint_app = None
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import re
+
+# Fixed part of the system prompt. It comes first and never changes, so it
+# is a stable prefix for the LLM provider's prompt caching.
+INSTRUCTIONS = """You are an agent solving problems in iterations with the tools listed below.
+
+Respond with EXACTLY ONE of:
+1. A function call, parameters in signature order separated by |:
+   FUNCTION_CALL: add|5|3
+   FUNCTION_CALL: open_paint|
+   open_paint returns a canvas id (e.g. 3f2a9c1b7d4e) that the other paint tools take first:
+   FUNCTION_CALL: draw_rectangle|3f2a9c1b7d4e|650|420|1050|820
+   FUNCTION_CALL: add_text|3f2a9c1b7d4e|Final answer is 489
+   FUNCTION_CALL: send_email|radiantracy@gmail.com|Math Result - Iteration 1|The result of adding 45 and 444 is 489
+2. Several calls at once as JSON with named arguments:
+   {"calls": [{"name": "add", "args": {"a": 5, "b": 3}}, {"name": "multiply", "args": {"a": 2, "b": 4}}]}
+3. The final answer:
+   FINAL_ANSWER: [number]
+
+Give ONE response at a time. Parameters marked ? are optional."""
+
+BATCH_HELP = """
+Independent calls in one JSON batch run at the same time. To use the result of an earlier call,
+give it an "id" and pass "$id" as an argument value (or "${id}" inside text); such calls wait for it:
+   {"calls": [{"id": "sum", "name": "add", "args": {"a": 45, "b": 444}}, {"name": "add_text", "args": {"canvas_id": "3f2a9c1b7d4e", "text": "Final answer is ${sum}"}}]}"""
+
+_TYPE_NAMES = {"integer": "int", "number": "float", "string": "str", "boolean": "bool", "object": "dict"}
+
+
+def type_name(schema: dict) -> str:
+    """Short type for a JSON schema: int, list[float], dict, int|str ..."""
+    options = schema.get("anyOf")
+    if options:
+        names = [type_name(option) for option in options if option.get("type") != "null"]
+        return "|".join(dict.fromkeys(names)) or "any"
+    kind = schema.get("type")
+    if kind == "array":
+        items = schema.get("items")
+        return f"list[{type_name(items)}]" if items else "list"
+    return _TYPE_NAMES.get(kind, "any")
+
+
+def tool_signature(tool) -> str:
+    """One line per tool: name(a: int, b?: str) - description"""
+    schema = tool.inputSchema or {}
+    required = set(schema.get("required", []))
+    params = ", ".join(
+        f"{name}{'' if name in required else '?'}: {type_name(info)}"
+        for name, info in schema.get("properties", {}).items()
+    )
+    description = re.sub(r"\s+", " ", tool.description or "").strip()
+    return f"{tool.name}({params}) - {description}" if description else f"{tool.name}({params})"
+
+
+def tools_key(tools_by_server: dict, parallel: bool) -> str:
+    """Hash of everything the prompt depends on"""
+    payload = [parallel] + [
+        [server, [[tool.name, tool.description, tool.inputSchema] for tool in tools]]
+        for server, tools in tools_by_server.items()
+    ]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class PromptBuilder:
+    """Renders system prompts and reuses them while the tool lists stay the same"""
+
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max_entries
+        self.prompts: dict[str, str] = {}
+
+    def build(self, tools_by_server: dict, parallel: bool = False) -> str:
+        """System prompt for tools grouped by server: the fixed instructions, then the tool signatures"""
+        key = tools_key(tools_by_server, parallel)
+        prompt = self.prompts.get(key)
+        if prompt is None:
+            sections = [INSTRUCTIONS + (BATCH_HELP if parallel else ""), "", "Tools, as name(param: type) - description:"]
+            for server, tools in tools_by_server.items():
+                if tools:
+                    sections.append(f"{server.upper()}:")
+                    sections.extend(tool_signature(tool) for tool in tools)
+            prompt = "\n".join(sections)
+            if len(self.prompts) >= self.max_entries:
+                self.prompts.pop(next(iter(self.prompts)))
+            self.prompts[key] = prompt
+        return prompt
+
+
+prompt_builder = PromptBuilder()
@@ -0,0 +1,45 @@
+import asyncio
+import inspect
+import time
+from dataclasses import dataclass
+
+
+@dataclass
+class LatencyProfile:
+    """How long a drawing backend may need to become ready after each kind of action.
+
+    Timeouts bound polling waits; settle delays cover UI state that cannot
+    be observed (e.g. a ribbon tool being selected). The all-zero default
+    makes in-memory and fake backends return instantly.
+    """
+    launch_timeout: float = 0.0
+    focus_timeout: float = 0.0
+    after_tool_select: float = 0.0
+    after_click: float = 0.0
+    poll_interval: float = 0.02
+
+
+async def wait_until(predicate, timeout: float, interval: float = 0.02, description: str = "condition"):
+    """Poll predicate (sync or async) until it returns something truthy, without blocking the event loop.
+
+    Returns the predicate's value; raises TimeoutError after `timeout` seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            value = predicate()
+            if inspect.isawaitable(value):
+                value = await value
+        except Exception:
+            value = None
+        if value:
+            return value
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Timed out after {timeout}s waiting for {description}")
+        await asyncio.sleep(interval)
+
+
+async def settle(seconds: float):
+    """Give the UI time to catch up; no-op for zero-latency backends"""
+    if seconds > 0:
+        await asyncio.sleep(seconds)
@@ -0,0 +1,55 @@
+import inspect
+import uuid
+from collections import OrderedDict
+
+
+class PageStore:
+    """Cursor-based paging for tool results too large to send in one response.
+
+    A tool returns the first page of a result plus a cursor; the client
+    passes the cursor to a next_page tool to get the following page.
+    Pages are produced by a fetch(start, stop) callable (sync or async),
+    so sequences can be computed one page at a time instead of all at
+    once. Only the `max_cursors` most recently used results are kept.
+    """
+
+    def __init__(self, page_size: int = 200, max_cursors: int = 256):
+        self.page_size = page_size
+        self.max_cursors = max_cursors
+        self.results: OrderedDict[str, tuple] = OrderedDict()
+
+    async def first_page(self, total: int, fetch, page_size: int = 0) -> dict:
+        """Register a result of `total` items and return its first page"""
+        key = uuid.uuid4().hex[:12]
+        page_size = page_size or self.page_size
+        if total > page_size:
+            self.results[key] = (total, fetch, page_size)
+            while len(self.results) > self.max_cursors:
+                self.results.popitem(last=False)
+        return await self._page(key, total, fetch, page_size, 0)
+
+    async def from_list(self, items: list) -> dict:
+        return await self.first_page(len(items), lambda start, stop: items[start:stop])
+
+    async def next_page(self, cursor: str) -> dict:
+        key, _, offset = cursor.partition(":")
+        if key not in self.results or not offset.isdigit():
+            raise ValueError(f"Unknown or expired cursor {cursor!r}; call the original tool again")
+        self.results.move_to_end(key)
+        total, fetch, page_size = self.results[key]
+        return await self._page(key, total, fetch, page_size, int(offset))
+
+    async def _page(self, key, total, fetch, page_size, start) -> dict:
+        stop = min(start + page_size, total)
+        items = fetch(start, stop) if stop > start else []
+        if inspect.isawaitable(items):
+            items = await items
+        if stop >= total:
+            # Last page served, the cursor is no longer needed
+            self.results.pop(key, None)
+        return {
+            "items": list(items),
+            "offset": start,
+            "total": total,
+            "next_cursor": f"{key}:{stop}" if stop < total else None,
+        }
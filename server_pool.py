@@ -0,0 +1,154 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+from tracing import tracer
+
+
+@dataclass
+class ServerConfig:
+    """How to launch one MCP server over stdio"""
+    name: str
+    command: str
+    args: list
+    env: dict = field(default_factory=dict)
+
+
+@dataclass
+class ServerHandle:
+    """A started (or failed) MCP server with its session and tools"""
+    name: str
+    session: Any = None
+    tools: list = field(default_factory=list)
+    timings: dict = field(default_factory=dict)
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.session is not None and self.error is None
+
+
+DEFAULT_SERVERS = [
+    ServerConfig("math", "python", ["math_server.py"]),
+    ServerConfig("paint", "python", ["paint_server.py"]),
+    ServerConfig("gmail", "python", ["gmail_server.py"]),
+]
+
+
+class ServerPool:
+    """Starts all configured MCP servers concurrently and keeps their sessions open.
+
+    Each server lives in its own task so that its stdio_client and ClientSession
+    contexts are entered and exited in the same task. A server that fails to
+    start is reported in its handle and does not stop the others.
+    """
+
+    def __init__(self, configs=None, startup_timeout: float = 30):
+        self.configs = list(configs or DEFAULT_SERVERS)
+        self.startup_timeout = startup_timeout
+        self.handles: dict[str, ServerHandle] = {}
+        self.startup_time = 0.0
+        self._tasks: list[asyncio.Task] = []
+        self._stop: asyncio.Event | None = None
+
+    async def _serve(self, config: ServerConfig, ready: asyncio.Future):
+        handle = ServerHandle(config.name)
+        start = time.monotonic()
+        start_ns = time.monotonic_ns()
+        try:
+            # Servers inherit our environment so their settings (limits, hosts) can be configured here
+            params = StdioServerParameters(command=config.command, args=config.args, env={**os.environ, **config.env})
+            async with stdio_client(params) as (read, write):
+                handle.timings["spawn"] = time.monotonic() - start
+                async with ClientSession(read, write) as session:
+                    mark = time.monotonic()
+                    await session.initialize()
+                    handle.timings["initialize"] = time.monotonic() - mark
+
+                    mark = time.monotonic()
+                    tools_result = await session.list_tools()
+                    handle.timings["list_tools"] = time.monotonic() - mark
+                    handle.timings["total"] = time.monotonic() - start
+
+                    handle.session = session
+                    handle.tools = tools_result.tools
+                    tracer.record("server.start", start_ns, time.monotonic_ns(), server=config.name, tools=len(handle.tools))
+                    ready.set_result(handle)
+
+                    # Keep the connection open until the pool is closed
+                    await self._stop.wait()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Report the underlying error rather than the task group wrapper
+            while isinstance(e, BaseExceptionGroup) and e.exceptions:
+                e = e.exceptions[0]
+            handle.error = f"{type(e).__name__}: {e}"
+            if not ready.done():
+                ready.set_result(handle)
+        finally:
+            handle.session = None
+
+    async def start(self):
+        """Launch every server and wait until all are ready, failed or timed out"""
+        self._stop = asyncio.Event()
+        start = time.monotonic()
+
+        with tracer.span("pool.start", servers=len(self.configs)):
+            futures = {}
+            for config in self.configs:
+                ready = asyncio.get_running_loop().create_future()
+                self._tasks.append(asyncio.create_task(self._serve(config, ready), name=f"mcp-{config.name}"))
+                futures[config.name] = ready
+
+            await asyncio.wait(futures.values(), timeout=self.startup_timeout)
+
+        for task, (name, ready) in zip(self._tasks, futures.items()):
+            if ready.done():
+                self.handles[name] = ready.result()
+            else:
+                task.cancel()
+                self.handles[name] = ServerHandle(name, error=f"Startup timed out after {self.startup_timeout}s")
+
+        self.startup_time = time.monotonic() - start
+        return self
+
+    async def close(self):
+        """Signal every server task to exit its contexts and wait for them"""
+        if self._stop is not None:
+            self._stop.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def get(self, name: str) -> ServerHandle | None:
+        handle = self.handles.get(name)
+        return handle if handle is not None and handle.ok else None
+
+    def tools(self, name: str) -> list:
+        handle = self.get(name)
+        return handle.tools if handle else []
+
+    def available(self) -> list[ServerHandle]:
+        return [handle for handle in self.handles.values() if handle.ok]
+
+    def startup_report(self) -> str:
+        """Per-server startup time breakdown"""
+        lines = [f"Server startup took {self.startup_time:.3f}s"]
+        for handle in self.handles.values():
+            if handle.ok:
+                timings = ", ".join(f"{step}={seconds:.3f}s" for step, seconds in handle.timings.items())
+                lines.append(f"  {handle.name}: {len(handle.tools)} tools ({timings})")
+            else:
+                lines.append(f"  {handle.name}: FAILED - {handle.error}")
+        return "\n".join(lines)
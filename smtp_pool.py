@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Errors after which a connection is discarded and the send retried once
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+
+class SMTPPool:
+    """Keep-alive SMTP connections shared across sends.
+
+    smtplib is blocking, so every SMTP conversation runs on a small
+    worker-thread pool and the server's event loop is never blocked.
+    Idle connections are checked with NOOP before reuse and replaced
+    when stale or broken.
+    """
+
+    def __init__(self, host: str, port: int, username: str | None = None, password: str | None = None,
+                 starttls: bool = True, size: int = 2, idle_timeout: float = 120, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.connects = 0
+        self._idle: list[tuple[smtplib.SMTP, float]] = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="smtp")
+
+    def _connect(self) -> smtplib.SMTP:
+        logger.info("Connecting to SMTP server %s:%s", self.host, self.port)
+        conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                conn.starttls()
+            # Local test servers may not offer AUTH at all
+            if self.username and conn.has_extn("auth"):
+                logger.info("Logging in to SMTP server")
+                conn.login(self.username, self.password)
+        except Exception:
+            self._close(conn)
+            raise
+        self.connects += 1
+        return conn
+
+    @staticmethod
+    def _close(conn: smtplib.SMTP):
+        try:
+            conn.quit()
+        except Exception:
+            conn.close()
+
+    def _acquire(self) -> smtplib.SMTP:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, last_used = self._idle.pop()
+            if time.monotonic() - last_used > self.idle_timeout:
+                self._close(conn)
+                continue
+            try:
+                if conn.noop()[0] == 250:
+                    return conn
+            except Exception:
+                pass
+            self._close(conn)
+        return self._connect()
+
+    def _release(self, conn: smtplib.SMTP):
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+
+    def send_sync(self, from_addr: str, to_addrs: list[str], message: str):
+        """Send one message on a pooled connection, reconnecting once if it was dropped"""
+        for attempt in range(2):
+            conn = self._acquire()
+            try:
+                conn.sendmail(from_addr, to_addrs, message)
+            except RECONNECT_ERRORS:
+                self._close(conn)
+                if attempt:
+                    raise
+                logger.warning("SMTP connection lost, reconnecting")
+                continue
+            except smtplib.SMTPRecipientsRefused:
+                # The connection is still fine, only this message failed
+                self._release(conn)
+                raise
+            except Exception:
+                self._close(conn)
+                raise
+            self._release(conn)
+            return
+
+    def send_batch_sync(self, from_addr: str, messages: list[tuple[list[str], str]]) -> list[Exception | None]:
+        """Send messages back to back on one connection; returns an error or None per message"""
+        results = []
+        conn = None
+        try:
+            for to_addrs, message in messages:
+                for attempt in range(2):
+                    if conn is None:
+                        conn = self._acquire()
+                    try:
+                        conn.sendmail(from_addr, to_addrs, message)
+                        results.append(None)
+                        break
+                    except RECONNECT_ERRORS as e:
+                        self._close(conn)
+                        conn = None
+                        if attempt:
+                            results.append(e)
+                    except smtplib.SMTPResponseException as e:
+                        # Rejected message (or recipients); the connection is still usable
+                        results.append(e)
+                        break
+                    except smtplib.SMTPRecipientsRefused as e:
+                        results.append(e)
+                        break
+        except Exception as e:
+            # Could not connect or log in: nothing else in this batch can be sent
+            if conn is not None:
+                self._close(conn)
+                conn = None
+            results.extend([e] * (len(messages) - len(results)))
+        if conn is not None:
+            self._release(conn)
+        return results
+
+    async def send_batch(self, from_addr: str, messages: list[tuple[list[str], str]]) -> list[Exception | None]:
+        """Send a batch of messages without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.send_batch_sync, from_addr, messages)
+
+    async def send(self, from_addr: str, to_addrs: list[str], message: str):
+        """Send one message without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.send_sync, from_addr, to_addrs, message)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,124 @@
+import asyncio
+import hashlib
+import io
+import mmap
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+# Output format -> Pillow format name and save options
+FORMATS = {
+    "png": ("PNG", {"optimize": False, "compress_level": 6}),
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 85}),
+}
+# Inputs at least this large are memory-mapped instead of read through a buffered file
+MMAP_THRESHOLD = 8 * 1024 * 1024
+
+
+def _open_source(path: str, file_size: int):
+    """Open an image, memory-mapping big files so only the parts the decoder touches are read"""
+    if file_size < MMAP_THRESHOLD:
+        return Image.open(path), None
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return Image.open(mapped), mapped
+
+
+def render_thumbnail(path: str, size: int, fmt: str, file_size: int) -> bytes:
+    """Decode, downscale and encode one image"""
+    pil_format, options = FORMATS[fmt]
+    img, mapped = _open_source(path, file_size)
+    try:
+        # JPEG can decode straight to a reduced scale, skipping most of the work
+        img.draft(img.mode, (size, size))
+        img.thumbnail((size, size), reducing_gap=2.0)
+
+        has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+        if has_alpha and fmt != "jpeg":
+            target = "RGBA"
+        elif img.mode in ("1", "L") and fmt != "webp":
+            target = "L"
+        else:
+            target = "RGB"
+        if img.mode != target:
+            img = img.convert(target)
+
+        buffer = io.BytesIO()
+        img.save(buffer, format=pil_format, **options)
+        return buffer.getvalue()
+    finally:
+        img.close()
+        if mapped is not None:
+            mapped.close()
+
+
+class ThumbnailCache:
+    """Encoded thumbnails on disk, keyed by (path, mtime, size) of the source and the requested output.
+
+    An edited source gets a new key, so entries never go stale; the
+    oldest files are pruned when the directory grows past `max_files`,
+    checked at startup and after every `max_files // 16` new entries.
+    """
+
+    def __init__(self, directory: str, max_files: int = 2048, workers: int = 4):
+        self.directory = directory
+        self.max_files = max_files
+        self.hits = 0
+        self.misses = 0
+        self.prune_every = max(1, max_files // 16)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+        os.makedirs(directory, exist_ok=True)
+        self.prune()
+
+    def _key(self, path: str, stat: os.stat_result, size: int, fmt: str) -> str:
+        source = f"{os.path.abspath(path)}\0{stat.st_mtime_ns}\0{stat.st_size}\0{size}\0{fmt}"
+        return hashlib.sha256(source.encode()).hexdigest()
+
+    def get(self, path: str, size: int = 100, fmt: str = "png") -> bytes:
+        """Thumbnail bytes for path, from the cache or freshly rendered"""
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown format {fmt!r}, expected one of {sorted(FORMATS)}")
+        if size <= 0:
+            raise ValueError("size must be positive")
+        stat = os.stat(path)
+        cache_path = os.path.join(self.directory, f"{self._key(path, stat, size, fmt)}.{fmt}")
+        try:
+            with open(cache_path, "rb") as f:
+                data = f.read()
+            self.hits += 1
+            return data
+        except FileNotFoundError:
+            pass
+
+        self.misses += 1
+        data = render_thumbnail(path, size, fmt, stat.st_size)
+        tmp = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, cache_path)
+        if self.misses % self.prune_every == 0:
+            self.prune()
+        return data
+
+    async def fetch(self, path: str, size: int = 100, fmt: str = "png") -> bytes:
+        """get() on the thread pool, keeping decoding off the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.get, path, size, fmt)
+
+    async def fetch_many(self, paths: list[str], size: int = 100, fmt: str = "png") -> list[bytes | Exception]:
+        """Thumbnails for many paths in parallel; a failed path gives its exception"""
+        return await asyncio.gather(*(self.fetch(path, size, fmt) for path in paths), return_exceptions=True)
+
+    def prune(self):
+        entries = [e for e in os.scandir(self.directory) if e.is_file()]
+        if len(entries) <= self.max_files:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_files]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
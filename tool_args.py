@@ -0,0 +1,214 @@
+import ast
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+
+class ToolArgumentError(ValueError):
+    """A tool argument that does not match the tool's input schema"""
+
+    def __init__(self, tool: str, param: str | None, value: Any, reason: str):
+        self.tool = tool
+        self.param = param
+        self.value = value
+        self.reason = reason
+        where = f"{tool}.{param}" if param else tool
+        super().__init__(f"Invalid argument {where}={value!r}: {reason}")
+
+
+@dataclass
+class ToolCall:
+    """One requested tool invocation, with raw params or keyword args.
+
+    In a batch, `id` names the call so later calls can list it in
+    `depends_on` or reference its result as "$id" / "${id}".
+    """
+    name: str
+    params: list | dict = field(default_factory=list)
+    id: str | None = None
+    depends_on: list = field(default_factory=list)
+
+
+@dataclass
+class ParsedResponse:
+    """Tool calls and/or final answer extracted from an LLM response"""
+    calls: list = field(default_factory=list)
+    final_answer: str | None = None
+
+
+def _parse_literal(value: str):
+    """Parse a JSON or Python literal without eval"""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return ast.literal_eval(value)
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        raise ValueError("expected an integer, got a boolean")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError("expected an integer")
+        return int(value)
+    return int(str(value).strip())
+
+
+def _to_float(value):
+    if isinstance(value, bool):
+        raise ValueError("expected a number, got a boolean")
+    if isinstance(value, (int, float)):
+        return float(value)
+    return float(str(value).strip())
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ("true", "1", "yes"):
+        return True
+    if text in ("false", "0", "no"):
+        return False
+    raise ValueError("expected true or false")
+
+
+def _to_str(value):
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def _compile_type(schema: dict) -> Callable[[Any], Any]:
+    """Compile a JSON schema fragment into a coercion function"""
+    # Optional[...] parameters come through as anyOf with a null branch
+    if "anyOf" in schema:
+        branches = [s for s in schema["anyOf"] if s.get("type") != "null"]
+        inner = _compile_type(branches[0]) if branches else _to_str
+        nullable = len(branches) < len(schema["anyOf"])
+
+        def coerce_optional(value):
+            if nullable and (value is None or (isinstance(value, str) and value.strip().lower() in ("", "none", "null"))):
+                return None
+            return inner(value)
+        return coerce_optional
+
+    schema_type = schema.get("type")
+    if schema_type == "integer":
+        return _to_int
+    if schema_type == "number":
+        return _to_float
+    if schema_type == "boolean":
+        return _to_bool
+    if schema_type == "array":
+        item = _compile_type(schema["items"]) if "items" in schema else None
+
+        def coerce_array(value):
+            if isinstance(value, str):
+                value = _parse_literal(value)
+            if not isinstance(value, (list, tuple)):
+                raise ValueError("expected a list")
+            return [item(v) for v in value] if item else list(value)
+        return coerce_array
+    if schema_type == "object":
+        def coerce_object(value):
+            if isinstance(value, str):
+                value = _parse_literal(value)
+            if not isinstance(value, dict):
+                raise ValueError("expected an object")
+            return value
+        return coerce_object
+    if schema_type == "string":
+        return _to_str
+    # Untyped schema, e.g. the items of a bare `list` parameter
+    return lambda value: value
+
+
+def compile_converter(tool) -> Callable[[list | dict], dict]:
+    """Compile a converter from call params to tool arguments, once per tool.
+
+    The converter accepts positional params from the pipe format or a
+    dict of keyword args from the JSON format, and raises
+    ToolArgumentError on missing, unknown or badly typed arguments.
+    """
+    schema = tool.inputSchema or {}
+    properties = schema.get("properties", {})
+    required = set(schema.get("required", []))
+    names = list(properties)
+    coercers = {name: _compile_type(info) for name, info in properties.items()}
+    tool_name = tool.name
+
+    def coerce(name, value):
+        try:
+            return coercers[name](value)
+        except (ValueError, TypeError, SyntaxError) as e:
+            raise ToolArgumentError(tool_name, name, value, str(e)) from None
+
+    def convert(params) -> dict:
+        if isinstance(params, dict):
+            unknown = set(params) - coercers.keys()
+            if unknown:
+                raise ToolArgumentError(tool_name, None, sorted(unknown), "unknown parameters")
+            arguments = {name: coerce(name, value) for name, value in params.items()}
+        else:
+            # Tools without parameters are called as "FUNCTION_CALL: name|"
+            if len(params) == 1 and params[0] == "" and not names:
+                params = []
+            if len(params) > len(names):
+                raise ToolArgumentError(tool_name, None, params, f"expected at most {len(names)} parameters")
+            arguments = {name: coerce(name, value) for name, value in zip(names, params)}
+
+        missing = required - arguments.keys()
+        if missing:
+            raise ToolArgumentError(tool_name, None, sorted(missing), "missing required parameters")
+        return arguments
+
+    return convert
+
+
+def _strip_code_fence(text: str) -> str:
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+
+def parse_response(text: str) -> ParsedResponse:
+    """Extract tool calls from a pipe-format or JSON-format LLM response"""
+    text = _strip_code_fence(text.strip())
+
+    if text.startswith("FUNCTION_CALL:"):
+        _, function_info = text.split(":", 1)
+        parts = [p.strip() for p in function_info.split("|")]
+        return ParsedResponse(calls=[ToolCall(parts[0], parts[1:])])
+
+    if text.startswith("FINAL_ANSWER:"):
+        return ParsedResponse(final_answer=text.split(":", 1)[1].strip())
+
+    if text.startswith(("{", "[")):
+        data = json.loads(text)
+        if isinstance(data, dict):
+            if "final_answer" in data:
+                return ParsedResponse(final_answer=str(data["final_answer"]))
+            data = data.get("calls", [data])
+        if not isinstance(data, list):
+            raise ValueError(f"calls must be a list, got {data!r}")
+        calls = []
+        for item in data:
+            if not isinstance(item, dict) or not isinstance(item.get("name"), str):
+                raise ValueError(f"Malformed call in JSON response: {item!r}")
+            args = item.get("args", item.get("arguments", {}))
+            if not isinstance(args, (dict, list)):
+                raise ValueError(f"args must be an object or a list: {item!r}")
+            if not isinstance(item.get("depends_on", []), list):
+                raise ValueError(f"depends_on must be a list of call ids: {item!r}")
+            calls.append(ToolCall(
+                item["name"],
+                args,
+                str(item["id"]) if "id" in item else None,
+                [str(d) for d in item.get("depends_on", [])],
+            ))
+        return ParsedResponse(calls=calls)
+
+    return ParsedResponse()
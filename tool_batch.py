@@ -0,0 +1,119 @@
+import asyncio
+import re
+from dataclasses import dataclass
+
+from tool_args import ToolArgumentError, ToolCall
+
+# "${id}" inside a string argument is replaced by the result of call `id`
+_REF_PATTERN = re.compile(r"\$\{([A-Za-z0-9_\-]+)\}")
+
+
+@dataclass
+class CallOutcome:
+    """Result of one call in a batch"""
+    call: ToolCall
+    arguments: dict | None = None
+    result: str | None = None
+    error: Exception | None = None
+
+
+def _references(value) -> set:
+    """Call ids referenced by an argument value"""
+    if isinstance(value, str):
+        refs = set(_REF_PATTERN.findall(value))
+        if value.startswith("$") and not value.startswith("${"):
+            refs.add(value[1:])
+        return refs
+    if isinstance(value, list):
+        return set().union(*(_references(v) for v in value)) if value else set()
+    if isinstance(value, dict):
+        return set().union(*(_references(v) for v in value.values())) if value else set()
+    return set()
+
+
+def _substitute(value, results: dict):
+    """Replace "$id" and "${id}" references with earlier call results"""
+    if isinstance(value, str):
+        if value.startswith("$") and value[1:] in results:
+            return results[value[1:]]
+        return _REF_PATTERN.sub(lambda m: results.get(m.group(1), m.group(0)), value)
+    if isinstance(value, list):
+        return [_substitute(v, results) for v in value]
+    if isinstance(value, dict):
+        return {k: _substitute(v, results) for k, v in value.items()}
+    return value
+
+
+def dependencies(call: ToolCall, ids: set) -> set:
+    """Explicit depends_on plus any call ids referenced in the arguments"""
+    params = call.params.values() if isinstance(call.params, dict) else call.params
+    refs = set(call.depends_on)
+    for value in params:
+        refs |= _references(value) & ids
+    return refs
+
+
+async def run_calls(calls: list, execute, concurrent: bool = True) -> list[CallOutcome]:
+    """Run a batch of calls in dependency order.
+
+    Calls whose dependencies are satisfied run together with
+    asyncio.gather; with concurrent=False they run one at a time in the
+    order given. A call whose dependency failed is not run, and a malformed
+    batch (duplicate ids, unknown depends_on) gives error outcomes instead
+    of raising, so the model can correct it.
+    `execute(call)` must return (arguments, result text).
+    """
+    # Only ids the model gave can be referenced; the rest get internal ids no reference can match
+    ids = {call.id for call in calls if call.id is not None}
+    if len(ids) != sum(call.id is not None for call in calls):
+        duplicates = [call.id for call in calls if call.id is not None]
+        return [CallOutcome(call, error=ToolArgumentError(call.name, None, duplicates, "duplicate call ids")) for call in calls]
+    for index, call in enumerate(calls):
+        if call.id is None:
+            call.id = f"#{index + 1}"
+
+    outcomes = {}
+    results = {}
+    pending = {}
+    for call in calls:
+        unknown = set(call.depends_on) - ids
+        if not isinstance(call.params, (dict, list)):
+            outcomes[call.id] = CallOutcome(call, error=ToolArgumentError(call.name, None, call.params, "arguments must be an object or a list"))
+        elif unknown:
+            outcomes[call.id] = CallOutcome(call, error=ToolArgumentError(call.name, None, sorted(unknown), "depends on unknown call ids"))
+        else:
+            pending[call.id] = (call, dependencies(call, ids - {call.id}))
+
+    async def run_one(call):
+        outcome = CallOutcome(call)
+        try:
+            resolved = ToolCall(call.name, _substitute(call.params, results), call.id)
+            outcome.arguments, outcome.result = await execute(resolved)
+            if call.id in ids:
+                results[call.id] = outcome.result
+        except Exception as e:
+            outcome.error = e
+        outcomes[call.id] = outcome
+
+    while pending:
+        ready = [call for call, deps in pending.values() if deps <= results.keys()]
+        blocked = [call for call, deps in pending.values() if deps & {i for i, o in outcomes.items() if o.error}]
+        for call in blocked:
+            outcomes[call.id] = CallOutcome(call, error=ToolArgumentError(call.name, None, sorted(pending[call.id][1]), "a dependency failed"))
+            del pending[call.id]
+        if not ready:
+            if not blocked:
+                for call, deps in pending.values():
+                    outcomes[call.id] = CallOutcome(call, error=ToolArgumentError(call.name, None, sorted(deps), "dependency cycle"))
+                break
+            continue
+
+        for call in ready:
+            del pending[call.id]
+        if concurrent:
+            await asyncio.gather(*(run_one(call) for call in ready))
+        else:
+            for call in ready:
+                await run_one(call)
+
+    return [outcomes[call.id] for call in calls]
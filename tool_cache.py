@@ -0,0 +1,83 @@
+import json
+import os
+from collections import OrderedDict
+
+
+def is_pure(tool) -> bool:
+    """A tool is cacheable if its server annotates it read-only, idempotent and closed-world"""
+    annotations = getattr(tool, "annotations", None)
+    if annotations is None:
+        return False
+    return bool(annotations.readOnlyHint and annotations.idempotentHint and annotations.openWorldHint is False)
+
+
+class ToolResultCache:
+    """LRU cache of pure tool results keyed on (tool, canonical arguments).
+
+    With a path, entries are loaded on creation and written back by save().
+    """
+
+    def __init__(self, max_entries: int = 1024, path: str | None = None):
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        if path and os.path.exists(path):
+            self.load()
+
+    @staticmethod
+    def key(tool: str, arguments: dict) -> str:
+        return json.dumps([tool, arguments], sort_keys=True, separators=(",", ":"))
+
+    def get(self, tool: str, arguments: dict) -> str | None:
+        key = self.key(tool, arguments)
+        result = self._entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, tool: str, arguments: dict, result: str) -> None:
+        key = self.key(tool, arguments)
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def load(self) -> None:
+        with open(self.path, encoding="utf-8") as f:
+            entries = json.load(f)
+        # Entries are stored oldest first, so the newest survive the size limit
+        for key, result in entries[-self.max_entries:]:
+            self._entries[key] = result
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(self._entries.items()), f)
+        os.replace(tmp_path, self.path)
+
+
+def create_cache() -> ToolResultCache | None:
+    """Build the cache from TOOL_CACHE_SIZE (0 disables) and TOOL_CACHE_PATH"""
+    max_entries = int(os.getenv("TOOL_CACHE_SIZE", "1024"))
+    if max_entries <= 0:
+        return None
+    return ToolResultCache(max_entries, os.getenv("TOOL_CACHE_PATH"))
@@ -0,0 +1,52 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from tool_args import compile_converter
+from tool_cache import is_pure
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ToolEntry:
+    """A tool together with the session that serves it"""
+    server: str
+    session: Any
+    tool: Any
+    convert: Callable[[list | dict], dict]
+    pure: bool = False
+
+
+@dataclass
+class ToolRegistry:
+    """Maps every tool name to its session, Tool and argument converter"""
+    entries: dict = field(default_factory=dict)
+    collisions: list = field(default_factory=list)
+
+    def add_server(self, server: str, session, tools) -> None:
+        """Register all tools of one server; the first server to claim a name keeps it"""
+        for tool in tools:
+            existing = self.entries.get(tool.name)
+            if existing is not None:
+                logger.warning("Tool name collision: %s is served by both %s and %s, keeping %s",
+                               tool.name, existing.server, server, existing.server)
+                self.collisions.append((tool.name, existing.server, server))
+                continue
+            self.entries[tool.name] = ToolEntry(server, session, tool, compile_converter(tool), is_pure(tool))
+
+    def tools_by_server(self) -> dict[str, list]:
+        """Registered tools grouped by the server that serves them, in registration order"""
+        grouped = {}
+        for entry in self.entries.values():
+            grouped.setdefault(entry.server, []).append(entry.tool)
+        return grouped
+
+    def get(self, name: str) -> ToolEntry | None:
+        return self.entries.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,99 @@
+import json
+import os
+
+from tracing import tracer
+
+# Paged results are followed up to this many items in total
+MAX_RESULT_ITEMS = int(os.getenv("RESULT_MAX_ITEMS", "5000"))
+# Longest tool result copied verbatim into the prompt
+PROMPT_RESULT_CHARS = int(os.getenv("RESULT_PROMPT_CHARS", "600"))
+
+
+def result_text(result) -> str:
+    """Text of a call_tool result, covering every content item rather than just the first"""
+    parts = []
+    for item in getattr(result, "content", None) or []:
+        if isinstance(item, str):
+            parts.append(item)
+        elif getattr(item, "type", None) == "text":
+            parts.append(item.text)
+        else:
+            mime = getattr(item, "mimeType", "") or ""
+            parts.append(f"<{item.type} {mime}, {len(getattr(item, 'data', '') or '') * 3 // 4} bytes>")
+    if not parts:
+        return str(result)
+    if len(parts) == 1:
+        return parts[0]
+    # A list return value arrives as one content item per element
+    return "[" + ", ".join(parts) + "]"
+
+
+def as_page(text: str) -> dict | None:
+    """The page dict if this result is the first page of a paged result"""
+    if not text.startswith("{"):
+        return None
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return None
+    if isinstance(value, dict) and "items" in value and "next_cursor" in value:
+        return value
+    return None
+
+
+async def collect_pages(session, page: dict, max_items: int = MAX_RESULT_ITEMS) -> tuple[list, int, str | None]:
+    """Follow next_cursor on the same server until the result or max_items runs out.
+
+    Returns (items, total, error): total is the size of the whole result and
+    error the reason a later page could not be fetched (e.g. an evicted cursor).
+    """
+    items = list(page["items"])
+    total = page["total"]
+    error = None
+    while page.get("next_cursor") and len(items) < max_items:
+        result = await session.call_tool("next_page", arguments={"cursor": page["next_cursor"]}, meta=tracer.request_meta())
+        text = result_text(result)
+        page = as_page(text)
+        if getattr(result, "isError", False) or page is None:
+            error = text
+            break
+        items.extend(page["items"])
+        total = page["total"]
+    return items[:max_items], total, error
+
+
+def items_text(items: list, total: int, error: str | None = None) -> str:
+    """Result text for a list, noting when only part of it was fetched"""
+    text = json.dumps(items)
+    if total > len(items):
+        text += f" (first {len(items)} of {total} items"
+        if error:
+            text += f"; later pages could not be fetched: {error}"
+        text += ")"
+    return text
+
+
+def prompt_view(text: str, max_chars: int = PROMPT_RESULT_CHARS) -> str:
+    """Size-bounded version of a result for the prompt: list summaries or head and tail of the text"""
+    if len(text) <= max_chars:
+        return text
+    items, note = None, ""
+    if text.startswith("["):
+        try:
+            items, end = json.JSONDecoder().raw_decode(text)
+            # Keep a note after the list, such as "(first 5000 of 20000 items)"
+            note = text[end:]
+        except ValueError:
+            items = None
+    if isinstance(items, list) and items:
+        head = ", ".join(str(v) for v in items[:8])
+        tail = ", ".join(str(v) for v in items[-3:])
+        summary = f"list of {len(items)} items: [{head}, ..., {tail}]"
+        numbers = [v for v in items if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        if len(numbers) == len(items):
+            summary += f" min={min(numbers)} max={max(numbers)} sum={sum(numbers)}"
+        summary += note
+        if len(summary) <= max_chars:
+            return summary
+    half = max_chars // 2
+    return f"{text[:half]} ...[{len(text) - 2 * half} characters omitted]... {text[-half:]}"
@@ -0,0 +1,129 @@
+# Picks the tools relevant to a query so the system prompt stays about the
+# same size however many MCP servers are connected. A BM25 index over tool
+# names, descriptions and parameter names is built locally when the agent
+# starts; no network or model is involved.
+import math
+import re
+from collections import Counter
+
+from prompt_builder import prompt_builder
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "each", "for", "from", "given", "in", "into", "is",
+    "it", "its", "of", "on", "one", "or", "the", "then", "this", "to", "with", "all", "return", "returns",
+}
+# Name tokens count this many times, so "add" ranks add() above tools that only mention adding
+NAME_WEIGHT = 3
+# A description naming more tools than this is listing what it can do (evaluate), not what it needs
+MAX_REFERENCES = 2
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens without stopwords or numbers, split on snake_case and camelCase"""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text or "")
+    tokens = []
+    for word in re.findall(r"[a-z]+", text.lower()):
+        if word in STOPWORDS:
+            continue
+        # Plural to singular is the only stemming: emails -> email, numbers -> number
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def tool_terms(tool) -> list[str]:
+    """Index terms of a tool: its name (weighted), description and parameter names"""
+    params = " ".join((tool.inputSchema or {}).get("properties", {}))
+    return tokenize(tool.name) * NAME_WEIGHT + tokenize(tool.description) + tokenize(params)
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of documents given as term lists"""
+
+    def __init__(self, documents: list[list[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.counts = [Counter(terms) for terms in documents]
+        self.lengths = [len(terms) for terms in documents]
+        self.average_length = sum(self.lengths) / len(documents) if documents else 0.0
+        frequencies = Counter(term for counts in self.counts for term in counts)
+        total = len(documents)
+        self.idf = {term: math.log(1 + (total - df + 0.5) / (df + 0.5)) for term, df in frequencies.items()}
+
+    def scores(self, terms: list[str]) -> list[float]:
+        """Score of every document for the query terms"""
+        query = [term for term in set(terms) if term in self.idf]
+        results = []
+        for counts, length in zip(self.counts, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.average_length)
+            for term in query:
+                tf = counts.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            results.append(score)
+        return results
+
+
+class ToolSelector:
+    """Builds the system prompt for a query from the top_k most relevant tools.
+
+    Tools a selected tool depends on come along: tools named in its
+    description (next_page, get_send_status) and, for a required *_id
+    parameter, the tools that create that id (open_paint for canvas_id).
+    With top_k=0, a catalog of at most top_k tools, or a query that matches
+    no tool, the prompt lists the full catalog.
+    """
+
+    def __init__(self, registry, top_k: int = 10, parallel: bool = False):
+        self.top_k = top_k
+        self.parallel = parallel
+        self.entries = list(registry.entries.values())
+        self.index = BM25Index([tool_terms(entry.tool) for entry in self.entries])
+        self.companions = [self._companions(entry) for entry in self.entries]
+        self.full_prompt = prompt_builder.build(registry.tools_by_server(), parallel)
+        self.misses = 0
+
+    def _companions(self, entry) -> list[int]:
+        """Positions of the tools `entry` needs to be usable"""
+        description = (entry.tool.description or "").lower()
+        required = (entry.tool.inputSchema or {}).get("required", [])
+        ids = [name[:-3].replace("_", " ") + " id" for name in required if name.endswith("_id")]
+        referenced, creators = [], []
+        for position, other in enumerate(self.entries):
+            if other is entry:
+                continue
+            if re.search(rf"\b{re.escape(other.tool.name)}\b", description):
+                referenced.append(position)
+            other_description = (other.tool.description or "").lower()
+            if (other.server == entry.server and not (other.tool.inputSchema or {}).get("required")
+                    and any(phrase in other_description for phrase in ids)):
+                creators.append(position)
+        if len(referenced) > MAX_REFERENCES:
+            referenced = []
+        return sorted(set(referenced + creators))
+
+    def select(self, query: str) -> list | None:
+        """Tools for `query` in catalog order, or None when the full catalog should be used"""
+        if not self.top_k or len(self.entries) <= self.top_k:
+            return None
+        scores = self.index.scores(tokenize(query))
+        ranked = sorted((position for position, score in enumerate(scores) if score > 0), key=lambda p: -scores[p])
+        if not ranked:
+            self.misses += 1
+            return None
+        chosen = set(ranked[:self.top_k])
+        for position in list(chosen):
+            chosen.update(self.companions[position])
+        return [self.entries[position] for position in sorted(chosen)]
+
+    def system_prompt(self, query: str) -> str:
+        """System prompt listing the tools selected for `query`"""
+        selected = self.select(query)
+        if selected is None:
+            return self.full_prompt
+        tools_by_server = {}
+        for entry in selected:
+            tools_by_server.setdefault(entry.server, []).append(entry.tool)
+        return prompt_builder.build(tools_by_server, self.parallel)
@@ -0,0 +1,250 @@
+# Spans for the agent loop and the MCP servers, off unless TRACE_DIR is set.
+# Each process writes its own Chrome trace (or OpenTelemetry-style JSONL with
+# TRACE_FORMAT=otel) on exit; tool calls carry a traceparent in the request
+# _meta so server spans join the agent's trace. `python tracing.py TRACE_DIR`
+# merges a run's Chrome files and prints latency percentiles.
+import atexit
+import contextvars
+import glob
+import json
+import math
+import os
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+TRACE_DIR = os.getenv("TRACE_DIR")
+TRACE_FORMAT = os.getenv("TRACE_FORMAT", "chrome")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    # Groups spans of one top-level operation (one agent run) onto one timeline row
+    root_id: str
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict = field(default_factory=dict)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+def parse_traceparent(value: str | None) -> tuple[str, str] | None:
+    """(trace_id, parent span_id) from a W3C traceparent header"""
+    parts = (value or "").split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(durations: dict[str, list[float]]) -> dict:
+    """count/total/p50/p95/p99 in milliseconds per span name"""
+    summary = {}
+    for name, values in durations.items():
+        values = sorted(values)
+        summary[name] = {
+            "count": len(values),
+            "total_ms": round(sum(values), 3),
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+        }
+    return summary
+
+
+def format_summary(summary: dict) -> str:
+    lines = [f"{'span':<28}{'count':>7}{'total ms':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"]
+    for name, s in sorted(summary.items(), key=lambda item: -item[1]["total_ms"]):
+        lines.append(f"{name:<28}{s['count']:>7}{s['total_ms']:>12.1f}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}")
+    return "\n".join(lines)
+
+
+class Tracer:
+    """Records spans timed with the monotonic clock; the current span is tracked per task via contextvars"""
+
+    def __init__(self, service: str = "agent", enabled: bool = False):
+        self.service = service
+        self.enabled = enabled
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+        # Converts monotonic readings to wall-clock time so files from several processes line up
+        self._epoch_offset_ns = time.time_ns() - time.monotonic_ns()
+
+    @contextmanager
+    def span(self, name: str, traceparent: str | None = None, **attributes):
+        """Time the enclosed block as a child of the current span, or of a remote traceparent"""
+        if not self.enabled:
+            yield None
+            return
+        parent = _current_span.get()
+        remote = parse_traceparent(traceparent) if parent is None else None
+        if parent is not None:
+            trace_id, parent_id, root_id = parent.trace_id, parent.span_id, parent.root_id
+        elif remote is not None:
+            trace_id, parent_id = remote
+            root_id = parent_id
+        else:
+            trace_id, parent_id, root_id = secrets.token_hex(16), None, None
+        span_id = secrets.token_hex(8)
+        span = Span(name, trace_id, span_id, parent_id, root_id or span_id, time.monotonic_ns(), attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attributes["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.monotonic_ns()
+            _current_span.reset(token)
+            with self._lock:
+                self.spans.append(span)
+
+    def record(self, name: str, start_ns: int, end_ns: int, **attributes):
+        """Add an already timed span under the current one, for work that cannot be wrapped in a block"""
+        if not self.enabled:
+            return
+        parent = _current_span.get()
+        span_id = secrets.token_hex(8)
+        if parent is None:
+            span = Span(name, secrets.token_hex(16), span_id, None, span_id, start_ns, end_ns, attributes)
+        else:
+            span = Span(name, parent.trace_id, span_id, parent.span_id, parent.root_id, start_ns, end_ns, attributes)
+        with self._lock:
+            self.spans.append(span)
+
+    def traceparent(self) -> str | None:
+        """W3C traceparent for the current span, to send along with a request"""
+        span = _current_span.get()
+        if not self.enabled or span is None:
+            return None
+        return f"00-{span.trace_id}-{span.span_id}-01"
+
+    def request_meta(self) -> dict | None:
+        """_meta for an MCP request carrying the current trace context"""
+        traceparent = self.traceparent()
+        return {"traceparent": traceparent} if traceparent else None
+
+    def summary(self) -> dict:
+        durations = {}
+        with self._lock:
+            for span in self.spans:
+                durations.setdefault(span.name, []).append(span.duration_ms)
+        return summarize(durations)
+
+    def chrome_events(self) -> list[dict]:
+        pid = os.getpid()
+        return [
+            {
+                "name": span.name,
+                "cat": self.service,
+                "ph": "X",
+                "ts": (span.start_ns + self._epoch_offset_ns) / 1000,
+                "dur": (span.end_ns - span.start_ns) / 1000,
+                "pid": pid,
+                "tid": int(span.root_id[:8], 16),
+                "args": {"span_id": span.span_id, "parent_id": span.parent_id, **span.attributes},
+            }
+            for span in self.spans
+        ] + [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": self.service}}]
+
+    def otel_records(self) -> list[dict]:
+        return [
+            {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id or "",
+                "name": span.name,
+                "startTimeUnixNano": span.start_ns + self._epoch_offset_ns,
+                "endTimeUnixNano": span.end_ns + self._epoch_offset_ns,
+                "attributes": {key: str(value) for key, value in span.attributes.items()},
+                "resource": {"service.name": self.service},
+            }
+            for span in self.spans
+        ]
+
+    def export(self, directory: str | None = None, fmt: str | None = None) -> str | None:
+        """Write recorded spans to a per-process file in directory; returns its path"""
+        directory = directory or TRACE_DIR
+        fmt = fmt or TRACE_FORMAT
+        if not directory or not self.spans:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            if fmt == "otel":
+                path = os.path.join(directory, f"{self.service}-{os.getpid()}.jsonl")
+                with open(path, "w", encoding="utf-8") as f:
+                    for record in self.otel_records():
+                        f.write(json.dumps(record) + "\n")
+            else:
+                path = os.path.join(directory, f"{self.service}-{os.getpid()}.json")
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump({"traceEvents": self.chrome_events()}, f)
+        return path
+
+
+tracer = Tracer(enabled=bool(TRACE_DIR))
+
+
+def init_tracing(service: str):
+    """Name this process in traces and export its spans when it exits"""
+    tracer.service = service
+    if tracer.enabled:
+        atexit.register(tracer.export)
+
+
+def instrument_server(mcp, service: str):
+    """Record a span for every tool call a FastMCP server handles, joined to the caller's trace"""
+    init_tracing(service)
+    if not tracer.enabled:
+        return
+    tool_manager = mcp._tool_manager
+    call_tool = tool_manager.call_tool
+
+    async def traced_call_tool(name, arguments, context=None, convert_result=False):
+        meta = None
+        if context is not None and context.request_context.meta is not None:
+            meta = getattr(context.request_context.meta, "traceparent", None)
+        with tracer.span("tool.execute", traceparent=meta, tool=name):
+            return await call_tool(name, arguments, context=context, convert_result=convert_result)
+
+    tool_manager.call_tool = traced_call_tool
+
+
+def merge(directory: str) -> tuple[str, dict]:
+    """Combine every Chrome trace file in directory into merged.json and summarize all spans"""
+    events = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        if os.path.basename(path) == "merged.json":
+            continue
+        with open(path, encoding="utf-8") as f:
+            events.extend(json.load(f)["traceEvents"])
+    durations = {}
+    for event in events:
+        if event.get("ph") == "X":
+            durations.setdefault(f"{event['cat']}:{event['name']}", []).append(event["dur"] / 1000)
+    out = os.path.join(directory, "merged.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events}, f)
+    return out, summarize(durations)
+
+
+if __name__ == "__main__":
+    path, summary = merge(sys.argv[1] if len(sys.argv) > 1 else TRACE_DIR or "traces")
+    print(format_summary(summary))
+    print(f"Merged trace written to {path}")
@@ -0,0 +1,87 @@
+# Worker processes for math_server's CPU-heavy kernels.
+# Each worker runs one task at a time over its own pipe, so a task that
+# runs past its time limit is stopped by killing just its worker; tasks of
+# other requests on other workers keep running. Idle workers are reused,
+# so the spawn start-up cost is paid once per worker, not per task.
+import asyncio
+import multiprocessing
+
+
+class WorkerDied(RuntimeError):
+    """The worker process exited before returning a result"""
+
+
+def _serve(conn):
+    """Worker main loop: run (func, args) requests until the pipe closes"""
+    while True:
+        try:
+            func, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            reply = (True, func(*args))
+        except Exception as e:
+            reply = (False, e)
+        conn.send(reply)
+
+
+class Worker:
+    """One worker process and the parent's end of its pipe"""
+
+    def __init__(self, context):
+        # True from sending a task until its reply arrives
+        self.busy = False
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+    def call(self, func, args):
+        """Run func(*args) in the worker, blocking until it answers or dies"""
+        self.busy = True
+        try:
+            self.conn.send((func, args))
+            ok, value = self.conn.recv()
+        except (EOFError, OSError):
+            self.conn.close()
+            self.process.join()
+            raise WorkerDied(f"worker process exited with code {self.process.exitcode}") from None
+        self.busy = False
+        if not ok:
+            raise value
+        return value
+
+    def kill(self):
+        # The thread blocked in call() then sees the pipe close and returns
+        self.process.kill()
+
+
+class WorkerPool:
+    """Up to `size` worker processes, each running one task at a time"""
+
+    def __init__(self, size: int):
+        # spawn rather than fork: forking the running stdio server can deadlock its I/O threads
+        self.context = multiprocessing.get_context("spawn")
+        self.slots = asyncio.Semaphore(size)
+        self.idle: list[Worker] = []
+
+    async def run(self, timeout: float, func, *args):
+        """func(*args) in a worker; on a timeout, cancellation or crash only that worker is stopped"""
+        async with self.slots:
+            worker = self.idle.pop() if self.idle else Worker(self.context)
+            loop = asyncio.get_running_loop()
+            try:
+                # The blocking pipe read runs on a thread; killing the worker ends it
+                return await asyncio.wait_for(loop.run_in_executor(None, worker.call, func, args), timeout)
+            finally:
+                # A worker still busy with an abandoned task cannot take another one
+                if worker.busy:
+                    worker.kill()
+                else:
+                    self.idle.append(worker)
+
+    def close(self):
+        for worker in self.idle:
+            worker.kill()
+            worker.conn.close()
+        self.idle.clear()